@@ -0,0 +1,164 @@
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+
+from artists_blueprint import get_artist_detail
+from bookings import available_venues_query
+from models import db, Venue, VenueArtistShow, Artist
+from timeline import get_time_window, filter_time_window
+from typeahead import typeahead_index
+from venues_blueprint import get_venue_detail
+
+api_blueprint = Blueprint('api', __name__, url_prefix='/api')
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def ndjson_response(query, to_dict):
+    """Stream ``query`` as one JSON object per line.
+
+    Rows come from a server-side cursor in chunks of ``API_STREAM_CHUNK_SIZE`` so that
+    exporting a whole table uses constant memory.
+    """
+    chunk_size = current_app.config['API_STREAM_CHUNK_SIZE']
+    rows = query.execution_options(stream_results=True).yield_per(chunk_size)
+
+    def generate():
+        for row in rows:
+            yield json.dumps(to_dict(row), default=json_default) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def filter_by_location_and_name(query, model):
+    if request.args.get('city'):
+        query = query.filter(model.city.ilike(request.args['city']))
+    if request.args.get('state'):
+        query = query.filter(model.state == request.args['state'].upper())
+    if request.args.get('q'):
+        query = query.filter(model.name.ilike("%{}%".format(request.args['q'])))
+    return query
+
+
+def detail_response(data):
+    if data is None:
+        abort(404)
+    return current_app.response_class(json.dumps(data, default=json_default), mimetype='application/json')
+
+
+@api_blueprint.route('/venues')
+def venues():
+    query = filter_by_location_and_name(
+        db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.genres, Venue.seeking_talent),
+        Venue
+    )
+    return ndjson_response(query.order_by(Venue.id), lambda row: {
+        "id": row[0],
+        "name": row[1],
+        "city": row[2],
+        "state": row[3],
+        "genres": row[4],
+        "seeking_talent": row[5]
+    })
+
+
+@api_blueprint.route('/venues/available')
+def available_venues():
+    if not request.args.get('city'):
+        abort(400)
+    start, end = get_time_window(default_days=1)
+    query = available_venues_query(request.args['city'], request.args.get('state'), request.args.get('genre'),
+                                   start, end)
+    return ndjson_response(query, lambda row: {
+        "id": row[0],
+        "name": row[1],
+        "city": row[2],
+        "state": row[3],
+        "genres": row[4],
+        "seeking_talent": row[5]
+    })
+
+
+@api_blueprint.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    past_limit = request.args.get('past_limit', current_app.config['DETAIL_PAST_SHOWS_LIMIT'], type=int)
+    return detail_response(get_venue_detail(venue_id, past_limit))
+
+
+@api_blueprint.route('/artists')
+def artists():
+    query = filter_by_location_and_name(
+        db.session.query(Artist.id, Artist.name, Artist.city, Artist.state, Artist.genres, Artist.seeking_venue),
+        Artist
+    )
+    return ndjson_response(query.order_by(Artist.id), lambda row: {
+        "id": row[0],
+        "name": row[1],
+        "city": row[2],
+        "state": row[3],
+        "genres": row[4],
+        "seeking_venue": row[5]
+    })
+
+
+@api_blueprint.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    past_limit = request.args.get('past_limit', current_app.config['DETAIL_PAST_SHOWS_LIMIT'], type=int)
+    return detail_response(get_artist_detail(artist_id, past_limit))
+
+
+@api_blueprint.route('/shows')
+def shows():
+    now = datetime.utcnow()
+    query = db.session.query(VenueArtistShow.id,
+                             VenueArtistShow.venue_id,
+                             Venue.name,
+                             VenueArtistShow.artist_id,
+                             Artist.name,
+                             Artist.image_link,
+                             VenueArtistShow.start_time) \
+        .join(Venue, Venue.id == VenueArtistShow.venue_id) \
+        .join(Artist, Artist.id == VenueArtistShow.artist_id)
+    when = request.args.get('when', 'all')
+    if when == 'upcoming':
+        query = query.filter(VenueArtistShow.start_time >= now)
+    elif when == 'past':
+        query = query.filter(VenueArtistShow.start_time < now)
+    start, end = get_time_window()
+    query = filter_time_window(query, VenueArtistShow.start_time, start, end)
+    if request.args.get('venue_id', type=int):
+        query = query.filter(VenueArtistShow.venue_id == request.args.get('venue_id', type=int))
+    if request.args.get('artist_id', type=int):
+        query = query.filter(VenueArtistShow.artist_id == request.args.get('artist_id', type=int))
+
+    return ndjson_response(query.order_by(VenueArtistShow.start_time, VenueArtistShow.id), lambda row: {
+        "id": row[0],
+        "venue_id": row[1],
+        "venue_name": row[2],
+        "artist_id": row[3],
+        "artist_name": row[4],
+        "artist_image_link": row[5],
+        "start_time": row[6]
+    })
+
+
+@api_blueprint.route('/typeahead')
+def typeahead():
+    """Name and city suggestions for a prefix, answered from the in-process index.
+
+    The only queries are those of the index catching up with other workers, a few seconds apart.
+    """
+    limit = max(1, min(request.args.get('limit', current_app.config['TYPEAHEAD_LIMIT'], type=int), 50))
+    suggestions = []
+    typeahead_index.sync()
+    for _, kind, ref, label in typeahead_index.lookup(request.args.get('q', ''), limit):
+        if kind == 'city':
+            suggestions.append({"type": kind, "label": label, "city": ref[0], "state": ref[1]})
+        else:
+            suggestions.append({"type": kind, "id": ref, "label": label, "url": f"/{kind}s/{ref}"})
+    return current_app.response_class(json.dumps(suggestions), mimetype='application/json')
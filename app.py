@@ -3,76 +3,166 @@
 # ----------------------------------------------------------------------------#
 
 import logging
+import os
+from datetime import date
+from functools import lru_cache
 from logging import Formatter, FileHandler
 
 import babel
+import babel.dates
 import dateutil.parser
-from flask import Flask, render_template
+from flask import Flask, render_template, jsonify
 from flask_migrate import Migrate
 from flask_moment import Moment
 
+from api_blueprint import api_blueprint
 from artists_blueprint import artists_blueprint
+from assets import assets_group, init_assets
+from benchmarks import bench_group
+from bulk_import import import_command
+from commands import check_query_plans_command
+from counters import reconcile_counters_command
+from fragment_cache import FragmentCacheExtension, fragment_cache
+from instrumentation import init_sql_instrumentation
 from models import db
+from page_cache import page_cache
+from routing import get_engines, init_read_routing
+from seed import seed_command
 from shows_blueprint import shows_blueprint
+from typeahead import typeahead_index
 from venues_blueprint import venues_blueprint
 
 # ----------------------------------------------------------------------------#
-# App Config.
+# Filters.
 # ----------------------------------------------------------------------------#
-app = Flask(__name__)
-app.register_blueprint(venues_blueprint)
-app.register_blueprint(artists_blueprint)
-app.register_blueprint(shows_blueprint)
 
-moment = Moment(app)
-app.config.from_object('config')
-db.init_app(app)
-migrate = Migrate(app, db)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+    'day': "EEEE MMMM, d, y",
+    'time': "h:mma",
+}
 
 
-# ----------------------------------------------------------------------------#
-# Filters.
-# ----------------------------------------------------------------------------#
+@lru_cache(maxsize=None)
+def compiled_datetime_pattern(format, locale):
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+@lru_cache(maxsize=4096)
+def _format_datetime(value, format, locale):
+    pattern, locale = compiled_datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+def format_datetime(value, format='medium', locale='en'):
+    # views pass datetime and date objects; strings are still accepted for older callers
+    value = value if isinstance(value, date) else dateutil.parser.parse(value)
+    return _format_datetime(value, format, locale)
+
 
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
-@app.route('/')
 def index():
     return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+def cache_stats():
+    return jsonify({
+        "pages": page_cache.stats(),
+        "fragments": fragment_cache.stats(),
+        "typeahead": typeahead_index.stats(),
+    })
+
+
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+# ----------------------------------------------------------------------------#
+# App Config.
+# ----------------------------------------------------------------------------#
+def create_app(config_object='config'):
+    app = Flask(__name__)
+    app.register_blueprint(venues_blueprint)
+    app.register_blueprint(artists_blueprint)
+    app.register_blueprint(shows_blueprint)
+    app.register_blueprint(api_blueprint)
+
+    Moment(app)
+    app.config.from_object(config_object)
+    if not app.config['SECRET_KEY']:
+        # fine for a single dev server; every worker would get its own key, breaking sessions and flashes
+        app.config['SECRET_KEY'] = os.urandom(32)
+    db.init_app(app)
+    init_read_routing(app)
+    init_sql_instrumentation(app)
+    page_cache.init_app(app)
+    fragment_cache.init_app(app)
+    init_assets(app)
+    Migrate(app, db)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(bench_group)
+    app.cli.add_command(import_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(reconcile_counters_command)
+    app.cli.add_command(assets_group)
+
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.filters['datetime'] = format_datetime
+
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/_cache/stats', 'cache_stats', cache_stats)
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, server_error)
+
+    already_logging = any(isinstance(handler, FileHandler) and handler.baseFilename == os.path.abspath('error.log')
+                          for handler in app.logger.handlers)
+    if not app.debug and not already_logging:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+    return app
+
+
+def warm_up_templates(app):
+    # compile every page once so no request pays for parsing, and pre-forked workers share the result
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+
+def warm_up_pool(app, threads):
+    # open the connections the worker's threads can use at once up front, primary and replicas alike,
+    # then hand them back to the pool
+    size = min(app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'], threads)
+    with app.app_context():
+        for engine in get_engines(app):
+            connections = [engine.connect() for _ in range(size)]
+            for connection in connections:
+                connection.close()
+
+
+def warm_up_typeahead(app):
+    # the only full build: the pre-forking master runs it once and workers inherit the index, then catch up on
+    # changes through TypeaheadIndex.sync; every other entrypoint runs it once before serving
+    with app.app_context():
+        typeahead_index.build()
+        db.session.remove()
+
+
+app = create_app()
 
 # ----------------------------------------------------------------------------#
 # Launch.
@@ -80,6 +170,7 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
+    warm_up_typeahead(app)
     app.run()
 
 # Or specify port manually:
@@ -0,0 +1,80 @@
+import threading
+import time
+from itertools import groupby
+
+from flask import current_app
+
+from models import db, Venue
+from page_cache import bump_generations, generation_query
+
+# invalidated through the shared page cache generations, so every worker drops its copy
+AREA_SUMMARY_TAG = 'area_summary'
+
+_lock = threading.Lock()
+_summary = None
+_generation = None
+_built_at = 0.0
+
+
+def area_summary_query():
+    return db.session.query(Venue.city,
+                            Venue.state,
+                            Venue.id,
+                            Venue.name,
+                            Venue.upcoming_shows_count,
+                            Venue.version) \
+        .order_by(Venue.city, Venue.state, Venue.name, Venue.id)
+
+
+def group_areas(rows):
+    return [
+        {
+            "city": city_state[0],
+            "state": city_state[1],
+            "venues": [{
+                "id": row[2],
+                "name": row[3],
+                "num_upcoming_shows": row[4],
+                "version": row[5]
+            } for row in venue_rows]
+        } for city_state, venue_rows in groupby(rows, key=lambda row: (row[0], row[1]))
+    ]
+
+
+def area_summary_generation_query():
+    return generation_query(AREA_SUMMARY_TAG)
+
+
+def cached_area_summary(generation):
+    # upcoming counts drift as shows move into the past, so the summary also expires after a while
+    ttl = current_app.config['AREA_SUMMARY_TTL']
+    with _lock:
+        if _summary is not None and _generation == generation and time.monotonic() - _built_at < ttl:
+            return _summary
+    return None
+
+
+def store_area_summary(summary, generation):
+    # ``generation`` is the one read before the rows were, so a summary built across an invalidation is never reused
+    global _summary, _generation, _built_at
+    with _lock:
+        _summary = summary
+        _generation = generation
+        _built_at = time.monotonic()
+    return summary
+
+
+def get_area_summary():
+    generation = area_summary_generation_query().scalar()
+    summary = cached_area_summary(generation)
+    if summary is None:
+        summary = store_area_summary(group_areas(area_summary_query().all()), generation)
+    return summary
+
+
+def invalidate_area_summary():
+    """Drop the summary in every worker; call it once the write it reflects has been committed."""
+    global _summary
+    with _lock:
+        _summary = None
+    bump_generations(AREA_SUMMARY_TAG)
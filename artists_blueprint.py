@@ -1,79 +1,146 @@
 from datetime import datetime
+from functools import partial
 
-from flask import Blueprint, render_template, request, flash, url_for
-from sqlalchemy import func
+from flask import Blueprint, render_template, request, flash, url_for, abort, current_app
+from sqlalchemy import func, and_, true
 from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.utils import redirect
 
+from area_summary import invalidate_area_summary
+from counters import refresh_upcoming_counters
+from facets import browse
 from forms import ArtistForm
-from models import db, Venue, VenueArtistShow, Artist
+from models import db, Venue, VenueArtistShow, Artist, delete_by_ids, update_changed
+from page_cache import cached_page, invalidate_after_commit, invalidate_pages
+from pagination import keyset_query, keyset_page, get_page_size, encode_cursor
+from search import search_by_name_or_location
+from timeline import get_past_shows_limit, get_time_window, group_by_day, last_day, detail_shows_lateral, \
+    past_shows_count, split_detail_shows
+from typeahead import record_changes, typeahead_index
 
 artists_blueprint = Blueprint('artists', __name__, url_prefix='')
 
 
+def played_venue_ids(artist_ids):
+    rows = db.session.query(VenueArtistShow.venue_id) \
+        .filter(VenueArtistShow.artist_id.in_(artist_ids)) \
+        .distinct() \
+        .all()
+    return [row[0] for row in rows]
+
+
+def invalidate_artist_pages(*artist_ids, venue_ids=None):
+    # the artist name and image also appear on the pages of every venue they played at
+    if venue_ids is None:
+        venue_ids = played_venue_ids(artist_ids)
+    invalidate_pages('artists', 'shows',
+                     *(f'artist:{artist_id}' for artist_id in artist_ids),
+                     *(f'venue:{venue_id}' for venue_id in venue_ids))
+
+
+def delete_artists(artist_ids):
+    """Delete the artists and commit; returns how many were deleted and the venues they played at."""
+    # read before the cascade removes the shows that link them
+    venue_ids = played_venue_ids(artist_ids)
+    deleted = delete_by_ids(Artist, artist_ids)
+    # the cascade removed shows at these venues too
+    if venue_ids:
+        refresh_upcoming_counters(Venue, VenueArtistShow.venue_id, venue_ids)
+    record_changes('artist', *artist_ids)
+    db.session.commit()
+    return deleted, venue_ids
+
+
+def forget_deleted_artists(artist_ids, venue_ids):
+    # upcoming show counts of their venues change with the cascade
+    invalidate_after_commit(partial(invalidate_artist_pages, *artist_ids, venue_ids=venue_ids),
+                            invalidate_area_summary,
+                            partial(invalidate_pages, 'venues'))
+    typeahead_index.discard('artist', *artist_ids)
+
+
+def artists_page_query(page_size):
+    return keyset_query(db.session.query(Artist.id, Artist.name),
+                        key_columns=(Artist.name, Artist.id),
+                        key_types=(str, int),
+                        cursor=request.args.get('after'),
+                        page_size=page_size)
+
+
+def artist_letters_query():
+    # one grouped query for the A-Z index
+    first_letter = func.upper(func.substr(Artist.name, 1, 1))
+    return db.session.query(first_letter, func.count(Artist.id)) \
+        .group_by(first_letter) \
+        .order_by(first_letter)
+
+
+def render_artists(page_rows, letter_rows, page_size):
+    page = keyset_page(page_rows, row_key=lambda row: (row[1], row[0]), page_size=page_size)
+    data = [{
+        "id": row[0],
+        "name": row[1]
+    } for row in page.items]
+
+    # each letter jumps to the first name at or after it
+    letters = [{
+        "letter": letter,
+        "count": count,
+        "url": url_for('artists.artists', limit=page_size, after=encode_cursor((letter, 0)))
+    } for letter, count in letter_rows]
+
+    next_url = None
+    if page.next_cursor:
+        next_url = url_for('artists.artists', limit=page_size, after=page.next_cursor)
+    return render_template('pages/artists.html', artists=data, letters=letters, next_url=next_url)
+
+
 @artists_blueprint.route('/artists')
+@cached_page('artists')
 def artists():
-    data = list(map(lambda element: {
-        "id": element[0],
-        "name": element[1]
-    }, db.session.query(Artist.id, Artist.name).all()))
+    page_size = get_page_size('ARTISTS_PAGE_SIZE')
+    return render_artists(artists_page_query(page_size).all(), artist_letters_query().all(), page_size)
+
 
-    return render_template('pages/artists.html', artists=data)
+@artists_blueprint.route('/artists/browse')
+@cached_page('artists')
+def browse_artists():
+    data = browse(Artist, Artist.seeking_venue, 'artists.browse_artists',
+                  link=lambda artist_id: url_for('artists.show_artist', artist_id=artist_id))
+    return render_template('pages/browse.html', title='Artists', icon='fa-users', **data)
 
 
 @artists_blueprint.route('/artists/search', methods=['POST'])
 def search_artists():
-    now = datetime.utcnow()
-    like_search_term = "%{}%".format(request.form.get('search_term', ''))
-    artist_list = db.session.query(Artist.id, Artist.name, func.count(VenueArtistShow.id)) \
-        .join(VenueArtistShow, VenueArtistShow.artist_id == Artist.id) \
-        .filter(VenueArtistShow.start_time > now, Artist.name.ilike(like_search_term)) \
-        .group_by(Artist.id, Artist.name) \
-        .all()
-    response = {
-        "count": len(artist_list),
-        "data": [{
-            "id": artist[0],
-            "name": artist[1],
-            "num_upcoming_shows": artist[2]
-        } for artist in artist_list]
-    }
+    response = search_by_name_or_location(Artist, request.form.get('search_term', ''))
     return render_template('pages/search_artists.html',
                            results=response,
                            search_term=request.form.get('search_term', '')
                            )
 
 
-@artists_blueprint.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    # shows the artist page with the given artist_id
-    now = datetime.utcnow()
-    artist = Artist.query.get(artist_id)
-    upcoming_shows = list(map(lambda element: {
-        "venue_id": element[0],
-        "venue_name": element[1],
-        "venue_image_link": element[2],
-        "start_time": str(element[3])
-    }, db.session.query(VenueArtistShow.venue_id,
-                        Venue.name,
-                        Venue.image_link,
-                        VenueArtistShow.start_time)
-                              .join(Venue, Venue.id == VenueArtistShow.venue_id)
-                              .filter(VenueArtistShow.artist_id == artist_id, VenueArtistShow.start_time >= now)
-                              .all()))
-
-    past_shows = list(map(lambda element: {
-        "venue_id": element[0],
-        "venue_name": element[1],
-        "venue_image_link": element[2],
-        "start_time": str(element[3])
-    }, db.session.query(VenueArtistShow.venue_id,
-                        Venue.name,
-                        Venue.image_link,
-                        VenueArtistShow.start_time)
-                          .join(Venue, Venue.id == VenueArtistShow.venue_id)
-                          .filter(VenueArtistShow.artist_id == artist_id, VenueArtistShow.start_time < now)
-                          .all()))
+def artist_detail_query(artist_id, now, past_limit):
+    # one statement: the artist, its past show count and its shows, one row per show (or one without)
+    shows = detail_shows_lateral([VenueArtistShow.venue_id, Venue.name, Venue.image_link],
+                                 VenueArtistShow.__table__.outerjoin(Venue, Venue.id == VenueArtistShow.venue_id),
+                                 VenueArtistShow.artist_id, Artist.id, now, past_limit)
+    return db.session.query(Artist, past_shows_count(VenueArtistShow.artist_id, Artist.id, now), *shows.c) \
+        .outerjoin(shows, true()) \
+        .filter(Artist.id == artist_id)
+
+
+def artist_detail_from_rows(rows):
+    if not rows:
+        return None
+
+    artist = rows[0][0]
+    past_shows_count = rows[0][1]
+    upcoming_shows, past_shows = split_detail_shows(rows, lambda row: {
+        "venue_id": row[3],
+        "venue_name": row[4],
+        "venue_image_link": row[5],
+        "start_time": row[6]
+    })
 
     data = {
         "id": artist.id,
@@ -89,12 +156,97 @@ def show_artist(artist_id):
         "image_link": artist.image_link,
         "past_shows": past_shows,
         "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
+        "past_shows_count": past_shows_count,
         "upcoming_shows_count": len(upcoming_shows)
     }
+    return data
+
+
+def get_artist_detail(artist_id, past_limit):
+    return artist_detail_from_rows(artist_detail_query(artist_id, datetime.utcnow(), past_limit).all())
+
+
+@artists_blueprint.route('/artists/<int:artist_id>')
+@cached_page('artist:{artist_id}')
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    data = get_artist_detail(artist_id, get_past_shows_limit())
+    if data is None:
+        abort(404)
     return render_template('pages/show_artist.html', artist=data)
 
 
+@artists_blueprint.route('/artists/<int:artist_id>/calendar')
+@cached_page('artist:{artist_id}')
+def artist_calendar(artist_id):
+    start, end = get_time_window(current_app.config['CALENDAR_DEFAULT_DAYS'])
+    # range scan on the (artist_id, start_time) index, grouped into days in one pass
+    rows = db.session.query(Artist.name,
+                            VenueArtistShow.venue_id,
+                            Venue.name,
+                            Venue.image_link,
+                            VenueArtistShow.start_time) \
+        .outerjoin(VenueArtistShow, and_(VenueArtistShow.artist_id == Artist.id,
+                                         VenueArtistShow.start_time >= start,
+                                         VenueArtistShow.start_time < end)) \
+        .outerjoin(Venue, Venue.id == VenueArtistShow.venue_id) \
+        .filter(Artist.id == artist_id) \
+        .order_by(VenueArtistShow.start_time) \
+        .all()
+    if not rows:
+        abort(404)
+
+    shows = [{
+        "id": row[1],
+        "name": row[2],
+        "image_link": row[3],
+        "link": url_for('venues.show_venue', venue_id=row[1]),
+        "start_time": row[4]
+    } for row in rows if row[4] is not None]
+    return render_template('pages/calendar.html',
+                           title=rows[0][0],
+                           link=url_for('artists.show_artist', artist_id=artist_id),
+                           start=start,
+                           last_day=last_day(end),
+                           days=group_by_day(shows))
+
+
+@artists_blueprint.route('/artists/<int:artist_id>', methods=['POST'])
+def delete_artist(artist_id):
+    try:
+        deleted, venue_ids = delete_artists([artist_id])
+    except SQLAlchemyError:
+        flash('It was not possible to delete this Artist')
+        db.session.rollback()
+    else:
+        if not deleted:
+            abort(404)
+        forget_deleted_artists([artist_id], venue_ids)
+        flash('The artist has been removed together with all of their shows.')
+        return render_template('pages/home.html')
+    finally:
+        db.session.close()
+    return redirect(url_for('artists.artists'))
+
+
+@artists_blueprint.route('/artists/delete', methods=['POST'])
+def delete_artists_submission():
+    artist_ids = request.form.getlist('artist_ids', type=int)
+    try:
+        deleted, venue_ids = delete_artists(artist_ids) if artist_ids else (0, [])
+    except SQLAlchemyError:
+        flash('It was not possible to delete these Artists')
+        db.session.rollback()
+    else:
+        if deleted:
+            forget_deleted_artists(artist_ids, venue_ids)
+        flash(f'{deleted} artist(s) have been removed together with all of their shows.')
+        return render_template('pages/home.html')
+    finally:
+        db.session.close()
+    return redirect(url_for('artists.artists'))
+
+
 @artists_blueprint.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     form = ArtistForm()
@@ -117,31 +269,53 @@ def edit_artist(artist_id):
 @artists_blueprint.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     form = ArtistForm(request.form, meta={'csrf': False})
-    artist = Artist.query.get(artist_id)
 
     if form.validate_on_submit():
         try:
-            artist.name = form.name.data
-            artist.city = form.city.data
-            artist.state = form.state.data
-            artist.phone = form.phone.data
-            artist.genres = form.genres.data
-            artist.facebook_link = form.facebook_link.data
-            artist.image_link = form.image_link.data
-            artist.website_link = form.website_link.data
-            artist.seeking_venue = form.seeking_venue.data
-            artist.seeking_description = form.seeking_description.data
+            result = update_changed(Artist, artist_id, {
+                'name': form.name.data,
+                'city': form.city.data,
+                'state': form.state.data,
+                'phone': form.phone.data,
+                'genres': form.genres.data,
+                'facebook_link': form.facebook_link.data,
+                'image_link': form.image_link.data,
+                'website_link': form.website_link.data,
+                'seeking_venue': form.seeking_venue.data,
+                'seeking_description': form.seeking_description.data,
+            }, expected_version=request.form.get('version', type=int))
+            if result is None:
+                abort(404)
+            if result.conflict:
+                db.session.rollback()
+                flash('Artist ' + form.name.data + ' was changed by someone else while you were editing it. '
+                      'Your changes are kept below; compare them with the current details and submit again.')
+                # the submitted values stay in the form, next to the current row and its new version
+                return render_template('forms/edit_artist.html',
+                                       form=form,
+                                       artist=Artist.query.get_or_404(artist_id),
+                                       conflict=True), 409
+            if not result.changed:
+                flash('Artist ' + form.name.data + ' is unchanged.')
+                return redirect(url_for('artists.show_artist', artist_id=artist_id))
+            listed_changed = bool(result.changed.keys() & {'name', 'city', 'state'})
+            if listed_changed:
+                record_changes('artist', artist_id)
             db.session.commit()
-            flash('Artist ' + artist.name + ' was successfully edited!')
-            return redirect(url_for('artists.show_artist', artist_id=artist_id))
         except SQLAlchemyError:
             db.session.rollback()
+        else:
+            if listed_changed:
+                typeahead_index.update('artist', artist_id, form.name.data, form.city.data, form.state.data)
+            invalidate_after_commit(partial(invalidate_artist_pages, artist_id))
+            flash('Artist ' + form.name.data + ' was successfully edited!')
+            return redirect(url_for('artists.show_artist', artist_id=artist_id))
         finally:
             db.session.close()
 
     for key, value in form.errors.items():
         flash(f"{key}: {value}\n")
-    return render_template('forms/edit_artist.html', form=form, artist=artist)
+    return render_template('forms/edit_artist.html', form=form, artist=Artist.query.get_or_404(artist_id))
 
 
 @artists_blueprint.route('/artists/create', methods=['GET'])
@@ -171,12 +345,18 @@ def create_artist_submission():
                 seeking_description=form.seeking_description.data,
             )
             db.session.add(artist)
+            db.session.flush()
+            artist_id = artist.id
+            record_changes('artist', artist_id)
             db.session.commit()
-            flash('Artist ' + name + ' was successfully listed!')
-            return render_template('pages/home.html')
         except SQLAlchemyError:
             flash(f"An error occurred. Artist{f' {name} ' if name else ' '}could not be listed.")
             db.session.rollback()
+        else:
+            invalidate_after_commit(partial(invalidate_pages, 'artists'))
+            typeahead_index.update('artist', artist_id, name, form.city.data, form.state.data)
+            flash('Artist ' + name + ' was successfully listed!')
+            return render_template('pages/home.html')
         finally:
             db.session.close()
 
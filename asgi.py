@@ -0,0 +1,7 @@
+# ASGI entrypoint for the async read path, e.g.
+#   uvicorn asgi:application --workers 4
+from app import app, warm_up_typeahead
+from async_views import AsyncReadApp
+
+warm_up_typeahead(app)
+application = AsyncReadApp(app)
@@ -0,0 +1,157 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import AppGroup
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'form.css': [
+        'css/bootstrap.min.css',
+        'css/bootstrap-theme.min.css',
+        'css/layout.main.css',
+        'css/layout.forms.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+        'js/script.js',
+    ],
+    'body.js': [
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s+')
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+CSS_COLON = re.compile(r':\s+')
+
+
+def minify_css(source):
+    source = CSS_COMMENT.sub('', source)
+    source = CSS_SPACE.sub(' ', source)
+    source = CSS_PUNCTUATION.sub(r'\1', source)
+    source = CSS_COLON.sub(':', source)
+    return source.replace(';}', '}').strip()
+
+
+def bundle_source(static_folder, name):
+    parts = []
+    for path in BUNDLES[name]:
+        with open(os.path.join(static_folder, path), encoding='utf-8') as f:
+            source = f.read()
+        if name.endswith('.css') and '.min.' not in path:
+            source = minify_css(source)
+        parts.append(source.strip())
+    # a trailing line comment or missing semicolon in one script must not swallow the next
+    separator = '\n;\n' if name.endswith('.js') else '\n'
+    return separator.join(parts).encode('utf-8')
+
+
+def build_bundles(static_folder):
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name in BUNDLES:
+        content = bundle_source(static_folder, name)
+        stem, ext = os.path.splitext(name)
+        filename = f'{stem}.{hashlib.sha256(content).hexdigest()[:8]}{ext}'
+        path = os.path.join(dist, filename)
+        with open(path, 'wb') as f:
+            f.write(content)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(content, quality=11))
+        manifest[name] = filename
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_urls(name):
+    filename = current_app.extensions['assets'].get(name)
+    if filename is not None:
+        return [f'/static/{DIST_DIR}/{filename}']
+    return [f'/static/{path}' for path in BUNDLES[name]]
+
+
+def asset_tags(name, defer=False):
+    if name.endswith('.css'):
+        template = '<link type="text/css" rel="stylesheet" href="{}" />'
+    else:
+        template = '<script type="text/javascript" src="{}"' + (' defer' if defer else '') + '></script>'
+    return Markup('\n'.join(template.format(url) for url in asset_urls(name)))
+
+
+def dist_file(filename):
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    mimetype = None
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[candidate] and os.path.isfile(os.path.join(dist, filename + suffix)):
+            encoding = candidate
+            mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+            filename = filename + suffix
+            break
+    response = send_from_directory(dist, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_assets(app):
+    # the manifest is read once per process; rebuild and restart to pick up new bundles
+    app.extensions['assets'] = load_manifest(app.static_folder)
+    app.jinja_env.globals['asset_tags'] = asset_tags
+    app.add_url_rule(f'/static/{DIST_DIR}/<path:filename>', 'dist_file', dist_file)
+
+
+assets_group = AppGroup('assets', help='Build fingerprinted static bundles.')
+
+
+@assets_group.command('build')
+def build_assets_command():
+    """Bundle, minify and pre-compress the layout CSS and JS into static/dist."""
+    manifest = build_bundles(current_app.static_folder)
+    for name, filename in sorted(manifest.items()):
+        click.echo(f'{name} -> {DIST_DIR}/{filename}')
+    if brotli is None:
+        click.echo('brotli is not installed; only gzip variants were written.')
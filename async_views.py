@@ -0,0 +1,164 @@
+import random
+import re
+from datetime import datetime
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import abort, g, render_template, request, session
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.exceptions import HTTPException
+
+from area_summary import area_summary_generation_query, area_summary_query, cached_area_summary, group_areas, \
+    store_area_summary
+from artists_blueprint import artist_detail_from_rows, artist_detail_query, artist_letters_query, \
+    artists_page_query, render_artists
+from page_cache import generation_query, page_cache
+from pagination import get_page_size
+from shows_blueprint import render_shows, shows_page_query
+from timeline import get_past_shows_limit
+from venues_blueprint import venue_detail_from_rows, venue_detail_query
+
+
+def async_database_uri(uri):
+    return re.sub(r'^postgres(ql)?(\+\w+)?://', 'postgresql+asyncpg://', uri)
+
+
+async def fetch_all(db_session, query):
+    # the queries are the same ones the sync views build; only their execution is awaited
+    return (await db_session.execute(query.statement)).all()
+
+
+async def fetch_scalar(db_session, query):
+    return (await db_session.execute(query.statement)).scalar()
+
+
+async def venues(db_session):
+    generation = await fetch_scalar(db_session, area_summary_generation_query())
+    summary = cached_area_summary(generation)
+    if summary is None:
+        summary = store_area_summary(group_areas(await fetch_all(db_session, area_summary_query())), generation)
+    return render_template('pages/venues.html', areas=summary)
+
+
+async def show_venue(db_session, venue_id):
+    query = venue_detail_query(venue_id, datetime.utcnow(), get_past_shows_limit())
+    data = venue_detail_from_rows(await fetch_all(db_session, query))
+    if data is None:
+        abort(404)
+    return render_template('pages/show_venue.html', venue=data)
+
+
+async def artists(db_session):
+    page_size = get_page_size('ARTISTS_PAGE_SIZE')
+    page_rows = await fetch_all(db_session, artists_page_query(page_size))
+    letter_rows = await fetch_all(db_session, artist_letters_query())
+    return render_artists(page_rows, letter_rows, page_size)
+
+
+async def show_artist(db_session, artist_id):
+    query = artist_detail_query(artist_id, datetime.utcnow(), get_past_shows_limit())
+    data = artist_detail_from_rows(await fetch_all(db_session, query))
+    if data is None:
+        abort(404)
+    return render_template('pages/show_artist.html', artist=data)
+
+
+async def shows(db_session):
+    page_size = get_page_size('SHOWS_PAGE_SIZE')
+    return render_shows(await fetch_all(db_session, shows_page_query(page_size)), page_size)
+
+
+ROUTES = [
+    (re.compile(r'^/venues$'), 'venues', venues),
+    (re.compile(r'^/venues/(?P<venue_id>\d+)$'), 'venue:{venue_id}', show_venue),
+    (re.compile(r'^/artists$'), 'artists', artists),
+    (re.compile(r'^/artists/(?P<artist_id>\d+)$'), 'artist:{artist_id}', show_artist),
+    (re.compile(r'^/shows$'), 'shows', shows),
+]
+
+
+class AsyncReadApp:
+    """ASGI application serving the read-only listing and detail pages from an async engine.
+
+    Every other request (forms, writes, search, the API, static files) is handed to the
+    Flask WSGI app unchanged. The Flask request context, before/after request hooks, page
+    cache and templates are shared with the sync views, so both paths render identical pages.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        config = app.config
+        engine_options = {key: value for key, value in config['SQLALCHEMY_ENGINE_OPTIONS'].items()
+                          if key != 'connect_args'}
+        engine_options['connect_args'] = {
+            'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT_MS'])}
+        }
+        self.primary = create_async_engine(async_database_uri(config['SQLALCHEMY_DATABASE_URI']), **engine_options)
+        self.replicas = [create_async_engine(async_database_uri(config['SQLALCHEMY_BINDS'][bind]), **engine_options)
+                         for bind in config['REPLICA_BINDS']]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            for pattern, tag, view in ROUTES:
+                match = pattern.match(scope['path'])
+                if match:
+                    kwargs = {key: int(value) for key, value in match.groupdict().items()}
+                    return await self.handle(scope, send, tag.format(**kwargs), view, kwargs)
+        await self.wsgi(scope, receive, send)
+
+    def choose_engine(self):
+        # same read-your-writes rule as the sync RoutingSession
+        if self.replicas and g.get('read_from_replica'):
+            return random.choice(self.replicas)
+        return self.primary
+
+    async def render(self, tag, view, kwargs):
+        # pages rendered with pending flash messages are user specific, never cache them
+        cacheable = not session.get('_flashes')
+        async with AsyncSession(self.choose_engine()) as db_session:
+            # the same generation check as cached_page, on the connection the page is rendered from
+            if cacheable:
+                generation = await fetch_scalar(db_session, generation_query(tag))
+                body = page_cache.get(request.full_path, generation)
+                if body is not None:
+                    return body
+            body = (await view(db_session, **kwargs)).encode()
+        if cacheable:
+            page_cache.set(request.full_path, tag, body, generation)
+        return body
+
+    async def handle(self, scope, send, tag, view, kwargs):
+        headers = {key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']}
+        ctx = self.app.test_request_context(scope['path'],
+                                            method=scope['method'],
+                                            query_string=scope['query_string'],
+                                            headers=headers,
+                                            base_url=f"{scope.get('scheme', 'http')}://{headers.get('host', 'localhost')}")
+        ctx.push()
+        try:
+            try:
+                response = self.app.preprocess_request()
+                if response is None:
+                    response = await self.render(tag, view, kwargs)
+            except HTTPException as error:
+                response = self.app.handle_http_exception(error)
+            except Exception as error:
+                response = self.app.handle_exception(error)
+            response = self.app.process_response(self.app.make_response(response))
+        finally:
+            ctx.pop()
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(key.lower().encode('latin-1'), value.encode('latin-1'))
+                        for key, value in response.headers.items()],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'' if scope['method'] == 'HEAD' else response.get_data(),
+        })
+
+    async def dispose(self):
+        for engine in [self.primary, *self.replicas]:
+            await engine.dispose()
@@ -0,0 +1,451 @@
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import babel.dates
+import click
+import dateutil.parser
+from flask import current_app, render_template
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, text
+
+from bookings import available_venues_query
+from fragment_cache import fragment_cache
+from models import db, Venue, Artist, VenueArtistShow, delete_by_ids
+from page_cache import page_cache
+from route_cases import route_cases, rolled_back_session, uncovered_endpoints
+from routing import get_engines
+from seed import CITIES, GENRES, fake_venue, random_name
+from timeline import group_by_day
+from typeahead import TypeaheadIndex
+
+
+def legacy_format_datetime(value, format='medium'):
+    # the filter as it was before datetimes were passed straight through: parse a string, format with babel
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, query_counts):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "queries_per_request": statistics.mean(query_counts),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def best_of(repeat, func):
+    timings = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        func(run)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@click.group('bench')
+def bench_group():
+    """Performance benchmarks, run against the configured app."""
+
+
+@bench_group.command('datetime-filter')
+@click.option('--tiles', default=1000, show_default=True, help='Shows rendered per page.')
+@click.option('--repeat', default=5, show_default=True)
+@with_appcontext
+def bench_datetime_filter_command(tiles, repeat):
+    """Compare the datetime filter with the legacy string-parsing filter on a large /shows page."""
+    format_datetime = current_app.jinja_env.filters['datetime']
+    base = datetime(2030, 1, 1, 20, 0)
+    # every run gets unseen datetimes so the filter's result cache does not flatter it
+    start_times = [[base + timedelta(hours=run * tiles + i) for i in range(tiles)] for run in range(repeat)]
+
+    legacy = best_of(repeat, lambda run: [legacy_format_datetime(str(value), 'full') for value in start_times[run]])
+    current = best_of(repeat, lambda run: [format_datetime(value, 'full') for value in start_times[run]])
+    click.echo(f'filter only, {tiles} values: legacy {legacy * 1000:.1f} ms, '
+               f'current {current * 1000:.1f} ms ({legacy / current:.1f}x)')
+
+    def render(run, filter_function, to_value):
+        shows = [{
+            "id": i,
+            "venue_id": 1,
+            "venue_name": "The Musical Hop",
+            "artist_id": 1,
+            "artist_name": "Guns N Petals",
+            "artist_image_link": "https://example.com/artist.jpg",
+            "start_time": to_value(value),
+            "venue_version": 1,
+            "artist_version": 1
+        } for i, value in enumerate(start_times[run])]
+        current_app.jinja_env.filters['datetime'] = filter_function
+        # cached tiles would skip the filter entirely
+        fragment_cache.clear()
+        with current_app.test_request_context('/shows'):
+            render_template('pages/shows.html', days=group_by_day(shows), when='all', next_url=None)
+
+    try:
+        legacy = best_of(repeat, lambda run: render(run, legacy_format_datetime, str))
+        current = best_of(repeat, lambda run: render(run, format_datetime, lambda value: value))
+    finally:
+        current_app.jinja_env.filters['datetime'] = format_datetime
+    click.echo(f'pages/shows.html, {tiles} tiles: legacy {legacy * 1000:.1f} ms, '
+               f'current {current * 1000:.1f} ms ({legacy / current:.1f}x)')
+
+
+@bench_group.command('tiles')
+@click.option('--tiles', default=5000, show_default=True, help='Shows rendered per page.')
+@click.option('--repeat', default=5, show_default=True)
+@with_appcontext
+def bench_tiles_command(tiles, repeat):
+    """Render a large /shows page with a cold and a warm tile fragment cache."""
+    base = datetime(2030, 1, 1, 20, 0)
+    shows = [{
+        "id": i,
+        "venue_id": i % 50 + 1,
+        "venue_name": f"Venue {i % 50 + 1}",
+        "artist_id": i % 200 + 1,
+        "artist_name": f"Artist {i % 200 + 1}",
+        "artist_image_link": "https://example.com/artist.jpg",
+        "start_time": base + timedelta(hours=i),
+        "venue_version": 1,
+        "artist_version": 1
+    } for i in range(tiles)]
+    days = group_by_day(shows)
+
+    def render(run, clear):
+        if clear:
+            fragment_cache.clear()
+        with current_app.test_request_context('/shows'):
+            render_template('pages/shows.html', days=days, when='all', next_url=None)
+
+    cold = best_of(repeat, lambda run: render(run, clear=True))
+    render(0, clear=False)
+    warm = best_of(repeat, lambda run: render(run, clear=False))
+
+    def render_after_edit(run):
+        # one artist edit re-keys only the tiles of that artist's shows
+        for show in shows:
+            if show["artist_id"] == 1:
+                show["artist_version"] += 1
+        render(run, clear=False)
+
+    edited = best_of(repeat, render_after_edit)
+    click.echo(f'pages/shows.html, {tiles} tiles: cold {cold * 1000:.1f} ms, warm {warm * 1000:.1f} ms '
+               f'({cold / warm:.1f}x), after one artist edit {edited * 1000:.1f} ms')
+    click.echo(f'fragment cache: {fragment_cache.stats()}')
+
+
+@bench_group.command('routes')
+@click.option('--requests', 'requests_per_route', default=50, show_default=True)
+@click.option('--warm/--cold', default=False, show_default=True,
+              help='Keep the page and fragment caches between requests instead of clearing them before each one.')
+@click.option('--output', type=click.Path(dir_okay=False), default='bench_report.json', show_default=True)
+@with_appcontext
+def bench_routes_command(requests_per_route, warm, output):
+    """Time every route case through the test client and count its SQL statements.
+
+    Writes latency percentiles and queries per request for each route to a JSON report
+    tagged with the current git commit, so runs can be compared across commits. Write
+    routes run in a transaction that is rolled back after each request.
+    """
+    query_count = [0]
+
+    def count_query(conn, cursor, statement, *args):
+        # the savepoints that keep write routes replayable are not queries of the route
+        if 'SAVEPOINT' not in statement[:30]:
+            query_count[0] += 1
+
+    cases = route_cases()
+    uncovered = uncovered_endpoints(current_app, cases)
+    if uncovered:
+        raise click.ClickException(f'No route case requests {", ".join(uncovered)}')
+    client = current_app.test_client()
+    engine = db.get_engine()
+    # read-only routes run on a replica when binds are configured, so count on every engine
+    engines = get_engines(current_app)
+    results = {}
+    for bind_engine in engines:
+        event.listen(bind_engine, 'before_cursor_execute', count_query)
+    try:
+        for case in cases:
+            latencies = []
+            query_counts = []
+            for _ in range(requests_per_route):
+                if not warm:
+                    page_cache.clear()
+                    fragment_cache.clear()
+                # each write starts from the same data: its transaction is rolled back once it is timed
+                with rolled_back_session() if case.writes else nullcontext():
+                    query_count[0] = 0
+                    start = time.perf_counter()
+                    response = client.open(case.url, method=case.method, data=case.form)
+                    latencies.append(time.perf_counter() - start)
+                    query_counts.append(query_count[0])
+                if response.status_code not in ((200, 302) if case.writes else (200,)):
+                    raise click.ClickException(f'{case.method} {case.url} returned {response.status_code}')
+            summary = results[f'{case.method} {case.url}'] = summarize(latencies, query_counts)
+            click.echo(f"{case.method} {case.url}: p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms, "
+                       f"{summary['queries_per_request']} queries")
+    finally:
+        for bind_engine in engines:
+            event.remove(bind_engine, 'before_cursor_execute', count_query)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.utcnow().isoformat(),
+        "database_url": repr(engine.url),
+        "page_cache": "warm" if warm else "cold",
+        "requests_per_route": requests_per_route,
+        "routes": results,
+    }
+    with open(output, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    click.echo(f'Report written to {output}')
+
+
+def insert_venue_with_shows(shows):
+    venue_id = db.session.execute(Venue.__table__.insert().returning(Venue.id), {
+        "name": "Benchmark Venue", "city": "San Francisco", "state": "CA", "address": "1 Benchmark Way",
+        "genres": ["Jazz"], "seeking_talent": False,
+    }).scalar()
+    artist_id = db.session.execute(Artist.__table__.insert().returning(Artist.id), {
+        "name": "Benchmark Artist", "city": "San Francisco", "state": "CA",
+        "genres": ["Jazz"], "seeking_venue": False,
+    }).scalar()
+    base = datetime(2030, 1, 1, 20, 0)
+    db.session.execute(VenueArtistShow.__table__.insert(), [{
+        "venue_id": venue_id, "artist_id": artist_id, "start_time": base + timedelta(hours=i)
+    } for i in range(shows)])
+    return venue_id
+
+
+def orm_delete_venue(venue_id):
+    # what deleting through loaded instances costs: every show is pulled into Python first
+    for show in VenueArtistShow.query.filter_by(venue_id=venue_id).all():
+        db.session.delete(show)
+    db.session.delete(Venue.query.get(venue_id))
+    db.session.flush()
+
+
+@bench_group.command('delete-venue')
+@click.option('--shows', default=10000, show_default=True, help='Shows attached to the deleted venue.')
+@click.option('--repeat', default=3, show_default=True)
+@with_appcontext
+def bench_delete_venue_command(shows, repeat):
+    """Time deleting a venue with many shows, set-based versus through the ORM.
+
+    Every run happens inside a transaction that is rolled back, so the database is left untouched.
+    """
+    def run(delete):
+        timings = []
+        for _ in range(repeat):
+            venue_id = insert_venue_with_shows(shows)
+            db.session.flush()
+            start = time.perf_counter()
+            delete(venue_id)
+            timings.append(time.perf_counter() - start)
+            db.session.rollback()
+        return min(timings)
+
+    set_based = run(lambda venue_id: delete_by_ids(Venue, [venue_id]))
+    orm = run(orm_delete_venue)
+    click.echo(f'venue with {shows} shows: set-based DELETE {set_based * 1000:.1f} ms, '
+               f'ORM delete {orm * 1000:.1f} ms ({orm / set_based:.1f}x)')
+
+
+@bench_group.command('availability')
+@click.option('--venues', 'venue_count', default=100000, show_default=True)
+@click.option('--shows-per-venue', default=5, show_default=True)
+@click.option('--queries', default=50, show_default=True)
+@click.option('--random-seed', default=42, show_default=True)
+@with_appcontext
+def bench_availability_command(venue_count, shows_per_venue, queries, random_seed):
+    """Time the venue availability search over a large synthetic set of venues.
+
+    The venues and shows are inserted and queried inside a transaction that is rolled back,
+    so the database is left untouched.
+    """
+    rng = random.Random(random_seed)
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    limit = current_app.config['SEARCH_RESULT_LIMIT']
+    try:
+        first_id = (db.session.query(func.max(Venue.id)).scalar() or 0) + 1
+        for offset in range(0, venue_count, 10000):
+            db.session.execute(Venue.__table__.insert(),
+                               [fake_venue(rng) for _ in range(min(10000, venue_count - offset))])
+        venue_ids = [row[0] for row in db.session.query(Venue.id).filter(Venue.id >= first_id)]
+        artist_id = db.session.execute(Artist.__table__.insert().returning(Artist.id), {
+            "name": "Benchmark Artist", "city": "San Francisco", "state": "CA",
+            "genres": ["Jazz"], "seeking_venue": False,
+        }).scalar()
+        shows = [{
+            "venue_id": venue_id,
+            "artist_id": artist_id,
+            "start_time": now + timedelta(hours=rng.randint(0, 60 * 24))
+        } for venue_id in venue_ids for _ in range(shows_per_venue)]
+        for offset in range(0, len(shows), 10000):
+            db.session.execute(VenueArtistShow.__table__.insert(), shows[offset:offset + 10000])
+        db.session.execute(text('ANALYZE venues'))
+        db.session.execute(text('ANALYZE artist_and_venue_shows'))
+        click.echo(f'{len(venue_ids)} venues and {len(shows)} shows inserted')
+
+        latencies = []
+        results = []
+        for _ in range(queries):
+            city, state = rng.choice(CITIES)
+            start = now + timedelta(hours=rng.randint(0, 60 * 24))
+            query = available_venues_query(city, state, rng.choice(GENRES), start, start + timedelta(hours=3))
+            began = time.perf_counter()
+            results.append(len(query.limit(limit).all()))
+            latencies.append(time.perf_counter() - began)
+    finally:
+        db.session.rollback()
+
+    latencies.sort()
+    click.echo(f'{queries} searches: p50 {percentile(latencies, 0.5) * 1000:.2f} ms, '
+               f'p99 {percentile(latencies, 0.99) * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms, '
+               f'{statistics.mean(results):.0f} venues per result (limit {limit})')
+
+
+@bench_group.command('typeahead')
+@click.option('--names', default=1000000, show_default=True, help='Synthetic artist names in the index.')
+@click.option('--lookups', default=10000, show_default=True)
+@click.option('--random-seed', default=42, show_default=True)
+@with_appcontext
+def bench_typeahead_command(names, lookups, random_seed):
+    """Time prefix lookups against an in-process typeahead index of synthetic names."""
+    rng = random.Random(random_seed)
+    index = TypeaheadIndex()
+    rows = [(i, random_name(rng), *rng.choice(CITIES)) for i in range(names)]
+    start = time.perf_counter()
+    index.load([('artist', rows)])
+    click.echo(f'{names} names indexed in {time.perf_counter() - start:.2f} s')
+    limit = current_app.config['TYPEAHEAD_LIMIT']
+
+    # prefixes a user produces while typing a name: every length from one character up
+    prefixes = []
+    while len(prefixes) < lookups:
+        name = rng.choice(rows)[1]
+        prefixes.extend(name[:length] for length in range(1, len(name) + 1))
+    latencies = []
+    for prefix in prefixes[:lookups]:
+        began = time.perf_counter()
+        index.lookup(prefix, limit)
+        latencies.append(time.perf_counter() - began)
+
+    latencies.sort()
+    click.echo(f'{lookups} lookups: p50 {percentile(latencies, 0.5) * 1000:.3f} ms, '
+               f'p99 {percentile(latencies, 0.99) * 1000:.3f} ms, max {latencies[-1] * 1000:.3f} ms')
+
+
+async def asgi_get(asgi_app, url):
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http', 'method': 'GET', 'scheme': 'http', 'path': parts.path,
+        'query_string': parts.query.encode(), 'headers': [(b'host', b'localhost')],
+    }
+    status = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await asgi_app(scope, receive, send)
+    return status[0]
+
+
+def concurrency_summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+@bench_group.command('async')
+@click.option('--url', default='/shows', show_default=True, help='Read-only page to request.')
+@click.option('--clients', default=200, show_default=True, help='Concurrent clients.')
+@click.option('--requests', 'requests_per_client', default=10, show_default=True)
+@click.option('--threads', default=32, show_default=True, help='Worker threads available to the sync path.')
+@with_appcontext
+def bench_async_command(url, clients, requests_per_client, threads):
+    """Compare the threaded WSGI path with the async ASGI path under many concurrent clients.
+
+    The page cache is disabled for the run so every request reaches the database.
+    """
+    from async_views import AsyncReadApp
+
+    app = current_app._get_current_object()
+    max_bytes = page_cache.max_bytes
+    page_cache.max_bytes = 0
+    page_cache.clear()
+    try:
+        def sync_client(_):
+            client = app.test_client()
+            latencies = []
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                client.get(url)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            sync_latencies = [latency for latencies in executor.map(sync_client, range(clients))
+                              for latency in latencies]
+        sync_result = concurrency_summary(sync_latencies, time.perf_counter() - start)
+
+        async def run_async():
+            asgi_app = AsyncReadApp(app)
+            latencies = []
+
+            async def async_client():
+                for _ in range(requests_per_client):
+                    start = time.perf_counter()
+                    await asgi_get(asgi_app, url)
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(async_client() for _ in range(clients)))
+            elapsed = time.perf_counter() - start
+            await asgi_app.dispose()
+            return concurrency_summary(latencies, elapsed)
+
+        async_result = asyncio.run(run_async())
+    finally:
+        page_cache.max_bytes = max_bytes
+
+    for name, result in ((f'sync, {threads} threads', sync_result), ('async', async_result)):
+        click.echo(f"{name}: {result['requests_per_second']} req/s, "
+                   f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms")
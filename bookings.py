@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY
+from flask import current_app
+from sqlalchemy import and_, bindparam, column, exists, func
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from counters import record_new_shows
+from models import db, Venue, Artist, VenueArtistShow
+
+RECURRENCE_FREQUENCIES = {
+    'daily': DAILY,
+    'weekly': WEEKLY,
+    'monthly': MONTHLY,
+}
+
+
+def get_show_length():
+    return timedelta(minutes=current_app.config['SHOW_LENGTH_MINUTES'])
+
+
+def expand_recurrence(start_time, repeat='none', occurrences=1, interval=1):
+    if repeat == 'none':
+        return [start_time]
+    return list(rrule(RECURRENCE_FREQUENCIES[repeat], dtstart=start_time, count=occurrences, interval=interval))
+
+
+def find_conflicts(venue_id, artist_id, start_times):
+    """Existing shows of the venue or the artist that overlap any of ``start_times``.
+
+    Two shows overlap when they start less than ``SHOW_LENGTH_MINUTES`` apart, so every
+    requested slot becomes a range scan on the (venue_id, start_time) and (artist_id,
+    start_time) indexes. All slots are checked in one statement.
+    """
+    length = get_show_length()
+    slot = func.unnest(bindparam('slots', value=list(start_times), type_=ARRAY(db.DateTime))) \
+        .table_valued(column('start_time', db.DateTime)) \
+        .render_derived(name='slot')
+
+    def overlapping(show_fk, entity_id):
+        return db.session.query(slot.c.start_time,
+                                VenueArtistShow.id,
+                                VenueArtistShow.venue_id,
+                                VenueArtistShow.artist_id,
+                                VenueArtistShow.start_time) \
+            .select_from(slot) \
+            .join(VenueArtistShow, and_(show_fk == entity_id,
+                                        VenueArtistShow.start_time > slot.c.start_time - length,
+                                        VenueArtistShow.start_time < slot.c.start_time + length))
+
+    rows = overlapping(VenueArtistShow.venue_id, venue_id) \
+        .union(overlapping(VenueArtistShow.artist_id, artist_id)) \
+        .all()
+    return sorted(rows, key=lambda row: (row[0], row[4]))
+
+
+def available_venues_query(city, state, genre, start, end):
+    """Venues in ``city`` (and ``state``, ``genre`` when given) with no show during ``[start, end)``.
+
+    The location filter is served by the (lower(city), state) index and the genre by the
+    GIN index on ``genres``; every candidate is then anti-joined against its shows with a
+    range probe on the (venue_id, start_time) index.
+    """
+    busy = exists().where(and_(VenueArtistShow.venue_id == Venue.id,
+                               VenueArtistShow.start_time > start - get_show_length(),
+                               VenueArtistShow.start_time < end))
+    query = db.session.query(Venue.id,
+                             Venue.name,
+                             Venue.city,
+                             Venue.state,
+                             Venue.genres,
+                             Venue.seeking_talent) \
+        .filter(func.lower(Venue.city) == city.strip().lower()) \
+        .filter(~busy)
+    if state:
+        query = query.filter(Venue.state == state.strip().upper())
+    if genre:
+        query = query.filter(Venue.genres.contains([genre]))
+    return query.order_by(Venue.name, Venue.id)
+
+
+def book_shows(venue_id, artist_id, start_times):
+    """Insert a show for every start time, or nothing at all; returns the reasons it refused.
+
+    The venue and artist rows are locked first, so two bookings for the same venue or
+    artist cannot both pass the conflict check. Runs in the caller's transaction, which
+    must be committed (or rolled back) by the caller.
+    """
+    start_times = sorted(start_times)
+    problems = []
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).with_for_update().scalar() is None:
+        problems.append(f'Venue {venue_id} does not exist.')
+    if db.session.query(Artist.id).filter(Artist.id == artist_id).with_for_update().scalar() is None:
+        problems.append(f'Artist {artist_id} does not exist.')
+    if problems:
+        return problems
+
+    length = get_show_length()
+    for earlier, later in zip(start_times, start_times[1:]):
+        if later - earlier < length:
+            problems.append(f'{earlier} and {later} overlap each other.')
+    for start_time, show_id, show_venue_id, show_artist_id, show_start in find_conflicts(venue_id, artist_id,
+                                                                                         start_times):
+        booked = 'venue' if show_venue_id == venue_id else 'artist'
+        problems.append(f'{start_time}: the {booked} is already booked for show {show_id} at {show_start}.')
+    if problems:
+        return problems
+
+    db.session.execute(VenueArtistShow.__table__.insert(), [{
+        "venue_id": venue_id,
+        "artist_id": artist_id,
+        "start_time": start_time
+    } for start_time in start_times])
+    record_new_shows(venue_id, artist_id, start_times)
+    return problems
@@ -0,0 +1,172 @@
+import csv
+import json
+import time
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from werkzeug.datastructures import MultiDict
+
+from area_summary import invalidate_area_summary
+from counters import refresh_all_upcoming_counters
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, VenueArtistShow
+from page_cache import invalidate_all_pages
+from typeahead import record_new_entities
+
+FALSE_VALUES = ('', '0', 'f', 'false', 'n', 'no', 'off')
+BOOLEAN_FIELDS = ('seeking_talent', 'seeking_venue')
+
+
+def read_rows(file, file_format):
+    """Yield ``(line number, row dict)`` from a CSV or JSONL stream without loading it whole."""
+    if file_format == 'csv':
+        for line_number, row in enumerate(csv.DictReader(file), start=2):
+            if row.get('genres') is not None:
+                row['genres'] = [genre.strip() for genre in row['genres'].split(';') if genre.strip()]
+            yield line_number, row
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                yield line_number, json.loads(line)
+
+
+def to_formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        if key in BOOLEAN_FIELDS:
+            value = value if isinstance(value, bool) else str(value).strip().lower() not in FALSE_VALUES
+            if value:
+                formdata.add(key, 'y')
+        elif isinstance(value, list):
+            for item in value:
+                formdata.add(key, item)
+        elif value is not None:
+            formdata.add(key, str(value))
+    return formdata
+
+
+def validate_row(form_class, row):
+    form = form_class(formdata=to_formdata(row), meta={'csrf': False})
+    if form.validate():
+        return {name: field.data for name, field in form._fields.items() if name != 'csrf_token'}, None
+    return None, form.errors
+
+
+def resolve_ids(model, rows, id_key, name_key):
+    # one query per batch for ids and one for names, instead of one lookup per show
+    ids = {int(row[id_key]) for row in rows if str(row.get(id_key) or '').isdigit()}
+    names = {row[name_key] for row in rows if row.get(name_key)}
+    existing_ids = set()
+    ids_by_name = {}
+    if ids:
+        existing_ids = {row[0] for row in db.session.query(model.id).filter(model.id.in_(ids))}
+    if names:
+        ids_by_name = dict(db.session.query(model.name, model.id).filter(model.name.in_(names)))
+
+    def resolve(row):
+        if str(row.get(id_key) or '').isdigit():
+            return int(row[id_key]) if int(row[id_key]) in existing_ids else None
+        return ids_by_name.get(row.get(name_key))
+
+    return resolve
+
+
+def prepare_entity_batch(form_class, batch):
+    valid = []
+    rejected = []
+    for line_number, row in batch:
+        values, errors = validate_row(form_class, row)
+        if errors:
+            rejected.append((line_number, errors))
+        else:
+            valid.append(values)
+    return valid, rejected
+
+
+def prepare_show_batch(batch):
+    rows = [row for _, row in batch]
+    resolve_venue = resolve_ids(Venue, rows, 'venue_id', 'venue_name')
+    resolve_artist = resolve_ids(Artist, rows, 'artist_id', 'artist_name')
+
+    valid = []
+    rejected = []
+    for line_number, row in batch:
+        venue_id = resolve_venue(row)
+        artist_id = resolve_artist(row)
+        values, errors = validate_row(ShowForm, {
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': row.get('start_time'),
+        })
+        errors = errors or {}
+        if not row.get('start_time'):
+            # ShowForm would silently fall back to its default start time
+            errors['start_time'] = ['This field is required.']
+        if venue_id is None:
+            errors['venue'] = ['Unknown venue']
+        if artist_id is None:
+            errors['artist'] = ['Unknown artist']
+        if errors:
+            rejected.append((line_number, errors))
+        else:
+            valid.append({'venue_id': venue_id, 'artist_id': artist_id, 'start_time': values['start_time']})
+    return valid, rejected
+
+
+IMPORT_KINDS = {
+    'venues': (Venue, lambda batch: prepare_entity_batch(VenueForm, batch)),
+    'artists': (Artist, lambda batch: prepare_entity_batch(ArtistForm, batch)),
+    'shows': (VenueArtistShow, prepare_show_batch),
+}
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORT_KINDS)))
+@click.argument('file', type=click.File('r'))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']),
+              help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows inserted per executemany.')
+@click.option('--rejects', type=click.File('w'), help='Write rejected rows and their errors here as JSONL.')
+@with_appcontext
+def import_command(kind, file, file_format, batch_size, rejects):
+    """Bulk import venues, artists or shows from a CSV or JSONL file.
+
+    Rows are validated with the same rules as the web forms, then inserted in batches with
+    a single executemany each. CSV genres are separated by ";". Shows reference their
+    venue and artist by venue_id/artist_id or venue_name/artist_name.
+    """
+    model, prepare_batch = IMPORT_KINDS[kind]
+    file_format = file_format or ('jsonl' if file.name.endswith(('.jsonl', '.ndjson')) else 'csv')
+    rows = read_rows(file, file_format)
+
+    imported = 0
+    rejected = 0
+    start = time.perf_counter()
+    last_id = db.session.query(func.coalesce(func.max(model.id), 0)).scalar()
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        valid, rejected_rows = prepare_batch(batch)
+        if valid:
+            db.session.execute(model.__table__.insert(), valid)
+            db.session.commit()
+        imported += len(valid)
+        rejected += len(rejected_rows)
+        for line_number, errors in rejected_rows:
+            if rejects:
+                rejects.write(json.dumps({'line': line_number, 'errors': errors}) + '\n')
+            else:
+                click.echo(f'line {line_number}: {errors}', err=True)
+        click.echo(f'{imported} {kind} imported, {rejected} rejected ({time.perf_counter() - start:.1f}s)')
+
+    if kind == 'shows':
+        refresh_all_upcoming_counters()
+    else:
+        # running workers add the new names to their typeahead index from these records
+        record_new_entities(kind[:-1], model, last_id)
+        db.session.commit()
+    invalidate_area_summary()
+    invalidate_all_pages()
@@ -0,0 +1,119 @@
+import json
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from fragment_cache import fragment_cache
+from models import db, Venue
+from page_cache import page_cache
+from route_cases import route_cases, rolled_back_session, uncovered_endpoints
+from routing import get_engines
+
+# tiny bookkeeping tables the planner rightly reads in full whatever the request
+SMALL_TABLES = {'cache_generations'}
+
+# below this many venues the planner prefers sequential scans everywhere, so the check would say nothing
+MIN_SEEDED_VENUES = 1000
+
+
+def capture_selects(client, method, url, form):
+    # read-only requests run on a replica when binds are configured, so listen on every engine
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((conn.engine, statement, parameters))
+
+    engines = get_engines(current_app)
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        # cached pages and fragments would hide the queries behind them
+        page_cache.clear()
+        fragment_cache.clear()
+        client.open(url, method=method, data=form)
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', capture)
+    return statements
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain_plans(statements):
+    """``(statement, index names, sequentially scanned tables)`` for each statement.
+
+    Each statement is explained on the engine that ran it, whose indexes are the ones
+    that matter, with the default planner settings.
+    """
+    plans = []
+    for engine in dict.fromkeys(engine for engine, _, _ in statements):
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for statement_engine, statement, parameters in statements:
+                if statement_engine is not engine:
+                    continue
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                nodes = list(plan_nodes(plan[0]['Plan']))
+                plans.append((statement,
+                              {node['Index Name'] for node in nodes if 'Index Name' in node},
+                              {node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan'}))
+            connection.rollback()
+        finally:
+            connection.close()
+    return plans
+
+
+def plan_failures(case, plans):
+    failures = []
+    used = set().union(*(indexes for _, indexes, _ in plans))
+    for expected in case.indexes:
+        alternatives = expected if isinstance(expected, tuple) else (expected,)
+        if used.isdisjoint(alternatives):
+            failures.append(f'does not use {" or ".join(alternatives)}')
+    for statement, _, scanned in plans:
+        unexpected = scanned - case.full_scans - SMALL_TABLES
+        if unexpected:
+            failures.append(f'reads {", ".join(sorted(unexpected))} sequentially:\n{statement}')
+    return failures
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """EXPLAIN every SELECT sent by the route cases and check each uses its intended indexes.
+
+    Run it against a seeded database (``flask seed --scale medium``): on a handful of rows
+    the planner rightly reads whole tables and the plans say nothing about production.
+    """
+    if db.session.query(Venue.id).count() < MIN_SEEDED_VENUES:
+        raise click.ClickException(f'Seed the database first: the check needs at least {MIN_SEEDED_VENUES} venues')
+    cases = route_cases()
+    uncovered = uncovered_endpoints(current_app, cases)
+    if uncovered:
+        raise click.ClickException(f'No route case requests {", ".join(uncovered)}')
+    client = current_app.test_client()
+    failures = 0
+    for case in cases:
+        if case.writes:
+            # the statements are explained after the rollback; EXPLAIN only needs their text and parameters
+            with rolled_back_session():
+                statements = capture_selects(client, case.method, case.url, case.form)
+        else:
+            statements = capture_selects(client, case.method, case.url, case.form)
+        for failure in plan_failures(case, explain_plans(statements)):
+            failures += 1
+            click.echo(f'{case.method} {case.url} {failure}\n', err=True)
+    if failures:
+        raise click.ClickException(f'{failures} query plan check(s) failed')
+    click.echo('All blueprint queries use their intended indexes.')
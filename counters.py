@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, func, select
+
+from area_summary import invalidate_area_summary
+from models import db, Venue, Artist, VenueArtistShow
+from page_cache import invalidate_all_pages
+
+COUNTED_MODELS = (
+    (Venue, VenueArtistShow.venue_id),
+    (Artist, VenueArtistShow.artist_id),
+)
+
+
+def record_new_shows(venue_id, artist_id, start_times):
+    """Bump the upcoming show counters of the shows' venue and artist in the current transaction."""
+    now = datetime.utcnow()
+    upcoming = [start_time for start_time in start_times if start_time is not None and start_time > now]
+    if not upcoming:
+        return
+    next_show_at = min(upcoming)
+    for model, entity_id in ((Venue, venue_id), (Artist, artist_id)):
+        db.session.query(model).filter(model.id == entity_id).update({
+            model.upcoming_shows_count: model.upcoming_shows_count + len(upcoming),
+            model.next_show_at: func.least(func.coalesce(model.next_show_at, next_show_at), next_show_at),
+        }, synchronize_session=False)
+
+
+def refresh_upcoming_counters(model, show_fk, ids=None, stale_only=False):
+    """Recompute counters from the shows table for ``ids``, every row, or only stale rows.
+
+    A row is stale once its ``next_show_at`` has passed, i.e. a show moved from upcoming
+    to past; that filter is served by the ``next_show_at`` index, so reconciling touches
+    only the rows that actually changed.
+    """
+    now = datetime.utcnow()
+    upcoming = and_(show_fk == model.id, VenueArtistShow.start_time > now)
+    statement = model.__table__.update().values(
+        upcoming_shows_count=select([func.count(VenueArtistShow.id)]).where(upcoming).as_scalar(),
+        next_show_at=select([func.min(VenueArtistShow.start_time)]).where(upcoming).as_scalar(),
+    )
+    if ids is not None:
+        statement = statement.where(model.id.in_(ids))
+    if stale_only:
+        statement = statement.where(model.next_show_at <= now)
+    return db.session.execute(statement).rowcount
+
+
+def refresh_all_upcoming_counters(stale_only=False):
+    updated = sum(refresh_upcoming_counters(model, show_fk, stale_only=stale_only)
+                  for model, show_fk in COUNTED_MODELS)
+    db.session.commit()
+    return updated
+
+
+@click.command('reconcile-counters')
+@click.option('--all', 'everything', is_flag=True, help='Recompute every row instead of only stale ones.')
+@with_appcontext
+def reconcile_counters_command(everything):
+    """Bring the upcoming show counters up to date; run periodically, e.g. every few minutes from cron."""
+    updated = refresh_all_upcoming_counters(stale_only=not everything)
+    if updated:
+        invalidate_area_summary()
+        invalidate_all_pages()
+    click.echo(f'{updated} venue and artist counters refreshed')
@@ -0,0 +1,113 @@
+from flask import request, url_for
+from sqlalchemy import distinct, func, true, tuple_
+
+from models import db
+from pagination import keyset_query, keyset_page, get_page_size
+
+SEEKING_LABELS = {True: 'Seeking', False: 'Not seeking'}
+
+
+def facet_filters(model, seeking_column):
+    """Filters selected through the ``genre`` (repeatable), ``state`` and ``seeking`` query arguments.
+
+    Genres use array containment, so several genres narrow to rows having all of them and
+    the filter is served by the GIN index on ``genres``.
+    """
+    filters = []
+    genres = [genre for genre in request.args.getlist('genre') if genre]
+    if genres:
+        filters.append(model.genres.contains(genres))
+    if request.args.get('state'):
+        filters.append(model.state == request.args['state'].upper())
+    if request.args.get('seeking') in ('0', '1'):
+        filters.append(seeking_column.is_(request.args['seeking'] == '1'))
+    return filters
+
+
+def facet_counts(model, seeking_column, filters):
+    """Genre, state and seeking counts of the filtered rows, from one GROUPING SETS query."""
+    genre = func.unnest(model.genres).table_valued('genre').render_derived(name='genre')
+    rows = db.session.query(genre.c.genre,
+                            model.state,
+                            seeking_column,
+                            func.grouping(genre.c.genre),
+                            func.grouping(model.state),
+                            # a row is repeated once per genre, so the state and seeking sets count it once
+                            func.count(distinct(model.id))) \
+        .select_from(model) \
+        .outerjoin(genre, true()) \
+        .filter(*filters) \
+        .group_by(func.grouping_sets(tuple_(genre.c.genre), tuple_(model.state), tuple_(seeking_column))) \
+        .all()
+
+    facets = {"genre": [], "state": [], "seeking": []}
+    for genre_value, state, seeking, genre_grouped, state_grouped, count in rows:
+        if not genre_grouped:
+            if genre_value is not None:
+                facets["genre"].append((genre_value, count))
+        elif not state_grouped:
+            facets["state"].append((state, count))
+        else:
+            facets["seeking"].append(('1' if seeking else '0', count))
+    for values in facets.values():
+        values.sort(key=lambda value: (-value[1], value[0]))
+    return facets
+
+
+def toggled_args(name, value, selected):
+    # the current query arguments with ``value`` switched on or off; genres combine, the other facets replace
+    args = request.args.copy()
+    args.pop('after', None)
+    if value in selected:
+        values = [item for item in selected if item != value]
+    elif name == 'genre':
+        values = selected + [value]
+    else:
+        values = [value]
+    args.setlist(name, values)
+    return args.to_dict(flat=False)
+
+
+def browse(model, seeking_column, endpoint, link):
+    """Template context for a faceted listing of ``model``: one page of rows plus facet counts."""
+    filters = facet_filters(model, seeking_column)
+    page_size = get_page_size('BROWSE_PAGE_SIZE')
+    rows = keyset_query(db.session.query(model.id, model.name, model.city, model.state).filter(*filters),
+                        key_columns=(model.name, model.id),
+                        key_types=(str, int),
+                        cursor=request.args.get('after'),
+                        page_size=page_size).all()
+    page = keyset_page(rows, row_key=lambda row: (row[1], row[0]), page_size=page_size)
+    counts = facet_counts(model, seeking_column, filters)
+
+    selected = {
+        "genre": [genre for genre in request.args.getlist('genre') if genre],
+        "state": [request.args['state'].upper()] if request.args.get('state') else [],
+        "seeking": [request.args['seeking']] if request.args.get('seeking') in ('0', '1') else [],
+    }
+    facets = {
+        name: [{
+            "value": value,
+            "label": SEEKING_LABELS[value == '1'] if name == 'seeking' else value,
+            "count": count,
+            "selected": value in selected[name],
+            "url": url_for(endpoint, **toggled_args(name, value, selected[name]))
+        } for value, count in values]
+        for name, values in counts.items()
+    }
+
+    next_url = None
+    if page.next_cursor:
+        next_url = url_for(endpoint, **{**request.args.to_dict(flat=False), 'after': page.next_cursor})
+    return {
+        "results": [{
+            "id": row[0],
+            "name": row[1],
+            "city": row[2],
+            "state": row[3],
+            "link": link(row[0])
+        } for row in page.items],
+        "total": sum(count for _, count in counts["seeking"]),
+        "facets": facets,
+        "next_url": next_url,
+    }
@@ -2,8 +2,8 @@ import re
 from datetime import datetime
 
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, URL, Optional, ValidationError
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, URL, Optional, ValidationError, NumberRange
 
 
 def validate_phone(form, field):
@@ -23,6 +23,22 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    repeat = SelectField(
+        'repeat',
+        choices=[
+            ('none', 'Does not repeat'),
+            ('daily', 'Daily'),
+            ('weekly', 'Weekly'),
+            ('monthly', 'Monthly'),
+        ],
+        default='none'
+    )
+    every = IntegerField(
+        'every', validators=[Optional(), NumberRange(min=1, max=12)], default=1
+    )
+    occurrences = IntegerField(
+        'occurrences', validators=[Optional(), NumberRange(min=1, max=52)], default=1
+    )
 
 class VenueForm(Form):
     name = StringField(
@@ -0,0 +1,36 @@
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from page_cache import PageCache
+
+fragment_cache = PageCache(config_prefix='FRAGMENT_CACHE')
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache 'show', show.id, show.venue_version %}...{% endcache %}``
+
+    Renders the block once per key and serves it from ``fragment_cache`` afterwards. The
+    key parts are joined with ``:`` and the first one is used as the cache tag. Keys should
+    include a version stamp of every entity the block shows, so an edit changes the key
+    instead of requiring an invalidation.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render_cached', [nodes.List(parts)]), [], [], body) \
+            .set_lineno(lineno)
+
+    def _render_cached(self, parts, caller):
+        key = ':'.join(str(part) for part in parts)
+        body = fragment_cache.get(key)
+        if body is None:
+            body = str(caller())
+            fragment_cache.set(key, str(parts[0]), body)
+        return Markup(body)
@@ -0,0 +1,37 @@
+# Pre-forking production launcher configuration: gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:{}'.format(os.environ.get('PORT', 8000)))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# a worker runs at most ``threads`` requests at once, so it never needs more connections per bind than that;
+# workers * threads must stay below the server's max_connections (per bind)
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+os.environ.setdefault('DB_MAX_OVERFLOW', '0')
+# import the app and compile its templates once in the master; workers inherit them copy-on-write
+preload_app = True
+accesslog = '-'
+
+
+def on_starting(server):
+    if not os.environ.get('SECRET_KEY'):
+        raise RuntimeError('SECRET_KEY must be set so that every worker signs sessions with the same key')
+
+
+def post_fork(server, worker):
+    # connections must never be shared across processes: give this worker fresh pools for every bind,
+    # leaving the inherited connections to the parent instead of closing them under it
+    from routing import get_engines
+    from wsgi import app
+    with app.app_context():
+        for engine in get_engines(app):
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # fill this worker's pool before it accepts traffic, so first requests do not pay for connecting
+    from app import warm_up_pool
+    from wsgi import app
+    warm_up_pool(app, worker.cfg.threads)
@@ -0,0 +1,69 @@
+import time
+from collections import Counter
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    # the listeners are process wide; only apps that enabled instrumentation are measured
+    if not has_app_context() or 'sql_instrumentation' not in current_app.extensions:
+        return
+    if elapsed > current_app.extensions['sql_instrumentation']['slow_query_seconds']:
+        # the statement only: bound parameters carry user data (search terms, phone numbers) into the log
+        current_app.logger.warning(f'Slow query ({elapsed * 1000:.1f} ms): {statement}')
+    if has_request_context():
+        g.sql_count = g.get('sql_count', 0) + 1
+        g.sql_time = g.get('sql_time', 0.0) + elapsed
+        g.setdefault('sql_statements', Counter())[statement] += 1
+
+
+def handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute; drop its start time so the stack stays balanced
+    connection = exception_context.connection
+    # without an execution context the statement failed before before_cursor_execute ran
+    if exception_context.execution_context is not None and connection is not None:
+        start_times = connection.info.get('query_start_time')
+        if start_times:
+            start_times.pop()
+
+
+def init_sql_instrumentation(app):
+    """Count statements and DB time per request on every engine the app uses.
+
+    Adds a ``Server-Timing`` header to each response, logs statements slower than
+    ``SLOW_QUERY_THRESHOLD_MS`` and warns when one statement shape repeats more than
+    ``N_PLUS_ONE_THRESHOLD`` times in a request. The per-statement work is two clock
+    reads and a counter update, so it stays on in production.
+
+    The ``Engine`` listeners are registered once per process, however many apps are created,
+    so statements are never counted twice.
+    """
+    if not app.config['SQL_INSTRUMENTATION']:
+        return
+    app.extensions['sql_instrumentation'] = {
+        'slow_query_seconds': app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000,
+    }
+    n_plus_one_threshold = app.config['N_PLUS_ONE_THRESHOLD']
+
+    for name, listener in (('before_cursor_execute', before_cursor_execute),
+                           ('after_cursor_execute', after_cursor_execute),
+                           ('handle_error', handle_error)):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+
+    @app.after_request
+    def add_server_timing(response):
+        count = g.get('sql_count', 0)
+        response.headers.add('Server-Timing', f'db;dur={g.get("sql_time", 0.0) * 1000:.2f};desc="{count} queries"')
+        for statement, repeats in g.get('sql_statements', Counter()).items():
+            if repeats > n_plus_one_threshold:
+                app.logger.warning(f'Possible N+1 on {request.method} {request.path}: '
+                                   f'statement ran {repeats} times: {statement}')
+        return response
@@ -0,0 +1,29 @@
+"""trigram search indexes on venue and artist names and locations
+
+Revision ID: 0ae6584c810b
+Revises: fc60055da9ff
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0ae6584c810b'
+down_revision = 'fc60055da9ff'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venues', 'artists'):
+        for column in ('name', 'city', 'state'):
+            op.create_index(f'ix_{table}_{column}_trgm', table, [column],
+                            postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('venues', 'artists'):
+        for column in ('name', 'city', 'state'):
+            op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
@@ -0,0 +1,26 @@
+"""state and name indexes for faceted browsing
+
+Revision ID: 34dacb67a99a
+Revises: 5c54e52a8169
+Create Date: 2026-10-18 16:48:19.230664
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '34dacb67a99a'
+down_revision = '5c54e52a8169'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venues_state', 'venues', ['state'])
+    op.create_index('ix_venues_name_id', 'venues', ['name', 'id'])
+    op.create_index('ix_artists_state', 'artists', ['state'])
+
+
+def downgrade():
+    op.drop_index('ix_artists_state', table_name='artists')
+    op.drop_index('ix_venues_name_id', table_name='venues')
+    op.drop_index('ix_venues_state', table_name='venues')
@@ -0,0 +1,32 @@
+"""typeahead change log
+
+Revision ID: 42a1610b30c6
+Revises: 34dacb67a99a
+Create Date: 2026-10-18 19:12:41.508317
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '42a1610b30c6'
+down_revision = '34dacb67a99a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('typeahead_changes',
+                    sa.Column('id', sa.BigInteger(), nullable=False),
+                    sa.Column('kind', sa.String(length=10), nullable=False),
+                    sa.Column('entity_id', sa.Integer(), nullable=False),
+                    sa.Column('changed_at', sa.DateTime(), server_default=sa.text('clock_timestamp()'),
+                              nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_typeahead_changes_changed_at'), 'typeahead_changes', ['changed_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_typeahead_changes_changed_at'), table_name='typeahead_changes')
+    op.drop_table('typeahead_changes')
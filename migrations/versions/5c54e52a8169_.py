@@ -0,0 +1,23 @@
+"""venue location index for availability searches
+
+Revision ID: 5c54e52a8169
+Revises: 893c7e08fbed
+Create Date: 2026-10-18 16:03:41.557902
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5c54e52a8169'
+down_revision = '893c7e08fbed'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venues_city_lower_state', 'venues', [sa.text('lower(city)'), 'state'])
+
+
+def downgrade():
+    op.drop_index('ix_venues_city_lower_state', table_name='venues')
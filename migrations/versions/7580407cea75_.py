@@ -0,0 +1,27 @@
+"""shared page cache generations
+
+Revision ID: 7580407cea75
+Revises: 42a1610b30c6
+Create Date: 2026-10-18 19:47:05.913872
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7580407cea75'
+down_revision = '42a1610b30c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_generations',
+                    sa.Column('tag', sa.String(), nullable=False),
+                    sa.Column('generation', sa.BigInteger(), nullable=False),
+                    sa.PrimaryKeyConstraint('tag')
+                    )
+
+
+def downgrade():
+    op.drop_table('cache_generations')
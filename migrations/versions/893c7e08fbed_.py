@@ -0,0 +1,25 @@
+"""version stamps on venues and artists
+
+Revision ID: 893c7e08fbed
+Revises: cba8afd4e467
+Create Date: 2026-10-18 15:12:07.418263
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '893c7e08fbed'
+down_revision = 'cba8afd4e467'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in ('venues', 'artists'):
+        op.drop_column(table, 'version')
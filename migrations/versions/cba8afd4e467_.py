@@ -0,0 +1,36 @@
+"""denormalized upcoming show counters on venues and artists
+
+Revision ID: cba8afd4e467
+Revises: e948f9bf18ae
+Create Date: 2026-10-18 13:40:52.306118
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'cba8afd4e467'
+down_revision = 'e948f9bf18ae'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, fk in (('venues', 'venue_id'), ('artists', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(), nullable=True))
+        op.execute(f"""
+            UPDATE {table} SET
+                upcoming_shows_count = (SELECT count(*) FROM artist_and_venue_shows s
+                                        WHERE s.{fk} = {table}.id AND s.start_time > now() at time zone 'utc'),
+                next_show_at = (SELECT min(s.start_time) FROM artist_and_venue_shows s
+                                WHERE s.{fk} = {table}.id AND s.start_time > now() at time zone 'utc')
+        """)
+        op.create_index(f'ix_{table}_next_show_at', table, ['next_show_at'])
+
+
+def downgrade():
+    for table in ('venues', 'artists'):
+        op.drop_index(f'ix_{table}_next_show_at', table_name=table)
+        op.drop_column(table, 'next_show_at')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,35 @@
+"""composite show and artist name indexes, genre GIN indexes
+
+Revision ID: e948f9bf18ae
+Revises: 0ae6584c810b
+Create Date: 2026-10-18 10:03:11.542871
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e948f9bf18ae'
+down_revision = '0ae6584c810b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_artist_and_venue_shows_venue_id_start_time', 'artist_and_venue_shows',
+                    ['venue_id', 'start_time'])
+    op.create_index('ix_artist_and_venue_shows_artist_id_start_time', 'artist_and_venue_shows',
+                    ['artist_id', 'start_time'])
+    op.create_index('ix_artist_and_venue_shows_start_time_id', 'artist_and_venue_shows',
+                    ['start_time', 'id'])
+    op.create_index('ix_artists_name_id', 'artists', ['name', 'id'])
+    op.create_index('ix_venues_genres', 'venues', ['genres'], postgresql_using='gin')
+    op.create_index('ix_artists_genres', 'artists', ['genres'], postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artists_genres', table_name='artists')
+    op.drop_index('ix_artists_name_id', table_name='artists')
+    op.drop_index('ix_venues_genres', table_name='venues')
+    op.drop_index('ix_artist_and_venue_shows_start_time_id', table_name='artist_and_venue_shows')
+    op.drop_index('ix_artist_and_venue_shows_artist_id_start_time', table_name='artist_and_venue_shows')
+    op.drop_index('ix_artist_and_venue_shows_venue_id_start_time', table_name='artist_and_venue_shows')
@@ -1,7 +1,13 @@
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import ForeignKey
+from collections import namedtuple
 
-db = SQLAlchemy()
+from sqlalchemy import ForeignKey, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from routing import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+EditResult = namedtuple('EditResult', ['changed', 'conflict'])
 
 
 def shorten(text):
@@ -10,8 +16,79 @@ def shorten(text):
     return text
 
 
+def delete_by_ids(model, ids):
+    # a single DELETE ... WHERE id = ANY(:ids); their shows go with them through ON DELETE CASCADE
+    ids_param = bindparam('ids', value=list(ids), type_=ARRAY(db.Integer))
+    return db.session.execute(model.__table__.delete().where(model.__table__.c.id == any_(ids_param))).rowcount
+
+
+def same_value(submitted, stored):
+    # an empty form field and a NULL column hold the same nothing
+    if submitted in ('', None) and stored in ('', None):
+        return True
+    # array columns (genres) are unordered: the form lists choices in its own order, not the stored one
+    if isinstance(submitted, list) and isinstance(stored, list):
+        return set(submitted) == set(stored)
+    return submitted == stored
+
+
+def update_changed(model, entity_id, values, expected_version=None):
+    """Write only the columns of ``values`` that differ from the stored row.
+
+    The row is read once. The UPDATE only matches while ``version`` is still the one the
+    editor started from (``expected_version``, or the one just read), so a concurrent edit
+    is reported as a conflict instead of being overwritten, without holding a row lock.
+    Returns None for a missing row; nothing is written when no value changed.
+    """
+    row = db.session.query(model.version, *(getattr(model, name) for name in values)) \
+        .filter(model.id == entity_id) \
+        .one_or_none()
+    if row is None:
+        return None
+    changed = {name: value for (name, value), stored in zip(values.items(), row[1:])
+               if not same_value(value, stored)}
+    if not changed:
+        return EditResult({}, False)
+
+    version = row[0] if expected_version is None else expected_version
+    updated = db.session.query(model) \
+        .filter(model.id == entity_id, model.version == version) \
+        .update({**changed, 'version': model.version + 1}, synchronize_session=False)
+    return EditResult(changed, updated == 0)
+
+
+class CacheGeneration(db.Model):
+    """Invalidation counter of one page cache tag, shared by every worker."""
+    __tablename__ = 'cache_generations'
+
+    tag = db.Column(db.String, primary_key=True)
+    generation = db.Column(db.BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<CacheGeneration tag:{self.tag}, generation:{self.generation}>"
+
+
+class TypeaheadChange(db.Model):
+    """A venue or artist that was created, edited or deleted, for every worker's typeahead index to replay."""
+    __tablename__ = 'typeahead_changes'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    # the time the row was written, not the time its transaction began
+    changed_at = db.Column(db.DateTime, server_default=db.text('clock_timestamp()'), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<TypeaheadChange id:{self.id}, kind:{self.kind}, entity_id:{self.entity_id}>"
+
+
 class VenueArtistShow(db.Model):
     __tablename__ = 'artist_and_venue_shows'
+    __table_args__ = (
+        db.Index('ix_artist_and_venue_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_artist_and_venue_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_artist_and_venue_shows_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, ForeignKey('venues.id', ondelete="CASCADE"))
@@ -30,6 +107,15 @@ class VenueArtistShow(db.Model):
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venues_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_venues_state_trgm', 'state', postgresql_using='gin', postgresql_ops={'state': 'gin_trgm_ops'}),
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venues_city_lower_state', db.text('lower(city)'), 'state'),
+        db.Index('ix_venues_state', 'state'),
+        db.Index('ix_venues_name_id', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -37,12 +123,18 @@ class Venue(db.Model):
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=True)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    # the PostgreSQL ARRAY type, whose contains() renders as @> and is served by the GIN index
+    genres = db.Column(ARRAY(db.String), nullable=False)
     facebook_link = db.Column(db.String(120), nullable=True)
     image_link = db.Column(db.String(500), nullable=True)
     website_link = db.Column(db.String(500), nullable=True)
     seeking_talent = db.Column(db.Boolean, default=False, nullable=False)
     seeking_description = db.Column(db.String(500), nullable=True)
+    # maintained by counters.py so listings never aggregate over the shows table
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    next_show_at = db.Column(db.DateTime, nullable=True, index=True)
+    # bumped by every edit; rendered tiles are cached under it
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
 
     def __repr__(self):
         return f"<Venue id:{self.id}, " \
@@ -61,18 +153,32 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artists_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_artists_state_trgm', 'state', postgresql_using='gin', postgresql_ops={'state': 'gin_trgm_ops'}),
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artists_name_id', 'name', 'id'),
+        db.Index('ix_artists_state', 'state'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=True)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    # the PostgreSQL ARRAY type, whose contains() renders as @> and is served by the GIN index
+    genres = db.Column(ARRAY(db.String), nullable=False)
     facebook_link = db.Column(db.String(120), nullable=True)
     image_link = db.Column(db.String(500), nullable=True)
     website_link = db.Column(db.String(500), nullable=True)
     seeking_venue = db.Column(db.Boolean, default=False, nullable=False)
     seeking_description = db.Column(db.String(500), nullable=True)
+    # maintained by counters.py so listings never aggregate over the shows table
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    next_show_at = db.Column(db.DateTime, nullable=True, index=True)
+    # bumped by every edit; rendered tiles are cached under it
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
 
     def __repr__(self):
         return f"<Artist id:{self.id}, " \
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session, make_response
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, CacheGeneration
+
+# bumping this tag invalidates every page at once
+ALL_PAGES = '*'
+
+
+class PageCache:
+    """In-process LRU cache of rendered GET pages.
+
+    Entries are keyed by request path and grouped under a tag such as ``venue:3`` so
+    that write handlers can drop every cached variant of the pages they affect. Entries
+    expire after ``PAGE_CACHE_TTL`` seconds and the least recently used ones are evicted
+    once the cached bodies exceed ``PAGE_CACHE_MAX_BYTES``.
+
+    An entry can be stored with a ``generation`` and is then only returned to a ``get``
+    that passes the same one; see ``cached_page``.
+    """
+
+    def __init__(self, app=None, config_prefix='PAGE_CACHE'):
+        self.config_prefix = config_prefix
+        self.ttl = 0
+        self.max_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config[f'{self.config_prefix}_TTL']
+        self.max_bytes = app.config[f'{self.config_prefix}_MAX_BYTES']
+
+    def get(self, key, generation=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] < time.monotonic() or entry[3] != generation:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, tag, body, generation=None):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (tag, body, time.monotonic() + self.ttl, generation)
+            self._tags.setdefault(tag, set()).add(key)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remove(self, key):
+        tag, body, _, _ = self._entries.pop(key)
+        self._size -= len(body)
+        keys = self._tags[tag]
+        keys.discard(key)
+        if not keys:
+            del self._tags[tag]
+
+
+page_cache = PageCache()
+
+
+def generation_query(tag):
+    # a tag's generation and the global one only ever grow, so their sum changes whenever either is bumped
+    return db.session.query(func.coalesce(func.sum(CacheGeneration.generation), 0)) \
+        .filter(CacheGeneration.tag.in_([tag, ALL_PAGES]))
+
+
+def bump_generations(*tags):
+    """Invalidate ``tags`` in every worker; call it once the write they reflect has been committed."""
+    statement = insert(CacheGeneration).values([{"tag": tag, "generation": 1} for tag in set(tags)])
+    statement = statement.on_conflict_do_update(index_elements=[CacheGeneration.tag],
+                                                set_={"generation": CacheGeneration.generation + 1})
+    # its own short transaction on the primary, independent of the caller's session
+    with db.engine.begin() as connection:
+        connection.execute(statement)
+
+
+def cached_page(tag):
+    """Cache the view's rendered page under ``tag``, formatted with the view arguments.
+
+    Every worker has its own cache, so the generation of the tag is read from the database
+    before each lookup, in one query on its primary key. A page is stored under the generation
+    read before it was rendered: if the tag is invalidated while the page renders, the page
+    is never served and is dropped by the next lookup.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            # pages rendered with pending flash messages are user specific, never cache them
+            if session.get('_flashes'):
+                return view(**kwargs)
+
+            key = request.full_path
+            page_tag = tag.format(**kwargs)
+            generation = generation_query(page_tag).scalar()
+            body = page_cache.get(key, generation)
+            if body is not None:
+                return make_response(body)
+
+            response = make_response(view(**kwargs))
+            if response.status_code == 200:
+                page_cache.set(key, page_tag, response.get_data(), generation)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_pages(*tags):
+    page_cache.invalidate(*tags)
+    bump_generations(*tags)
+
+
+def invalidate_all_pages():
+    page_cache.clear()
+    bump_generations(ALL_PAGES)
+
+
+def invalidate_after_commit(*invalidations):
+    """Call each of ``invalidations`` for a write that has already been committed.
+
+    Call it outside the ``try`` of the write: the write stands whatever happens here, so a
+    failed invalidation is logged rather than reported to the user, and the pages it left
+    stale expire with their TTL.
+    """
+    for invalidate in invalidations:
+        try:
+            invalidate()
+        except SQLAlchemyError:
+            current_app.logger.exception(f'Cache invalidation {invalidate!r} failed after a committed write')
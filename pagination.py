@@ -0,0 +1,59 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import tuple_
+
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, types):
+    # returns None for a missing or malformed cursor so the listing simply starts from the beginning
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(types):
+            return None
+        return tuple(datetime.fromisoformat(value) if value_type is datetime else value_type(value)
+                     for value, value_type in zip(values, types))
+    except (ValueError, TypeError):
+        return None
+
+
+def get_page_size(config_key):
+    page_size = request.args.get('limit', current_app.config[config_key], type=int)
+    return max(1, min(page_size, current_app.config['MAX_PAGE_SIZE']))
+
+
+def keyset_query(query, key_columns, key_types, cursor, page_size):
+    # one extra row tells whether there is a next page
+    after = decode_cursor(cursor, key_types)
+    if after is not None:
+        query = query.filter(tuple_(*key_columns) > after)
+    return query.order_by(*key_columns).limit(page_size + 1)
+
+
+def keyset_page(rows, row_key, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        next_cursor = encode_cursor(row_key(rows[page_size - 1]))
+    return Page(rows[:page_size], next_cursor)
+
+
+def keyset_paginate(query, key_columns, key_types, row_key, cursor, page_size):
+    """Return one page of ``query`` ordered by ``key_columns``.
+
+    ``key_columns`` must form a unique ordering (end it with a primary key) and ``row_key``
+    extracts the same values from a result row. Only ``page_size`` + 1 rows are ever read,
+    so the cost does not depend on how deep into the listing the page is.
+    """
+    rows = keyset_query(query, key_columns, key_types, cursor, page_size).all()
+    return keyset_page(rows, row_key, page_size)
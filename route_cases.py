@@ -0,0 +1,147 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
+
+from sqlalchemy import event
+
+from models import db, Venue, Artist
+
+# ``indexes`` must all show up in the plans of the request's statements (a tuple entry is satisfied by
+# any one of its names); ``full_scans`` are the tables the request is allowed to read sequentially;
+# ``writes`` requests are run in a transaction that is rolled back afterwards
+RouteCase = namedtuple('RouteCase', ['method', 'url', 'form', 'indexes', 'full_scans', 'writes'])
+
+# every route of these blueprints needs at least one case
+COVERED_BLUEPRINTS = ('venues', 'artists', 'shows', 'api')
+
+SHOWS_PAGE = 'ix_artist_and_venue_shows_start_time_id'
+VENUE_SHOWS = 'ix_artist_and_venue_shows_venue_id_start_time'
+ARTIST_SHOWS = 'ix_artist_and_venue_shows_artist_id_start_time'
+
+VENUE_FORM = {"name": "Benchmark Venue", "city": "San Francisco", "state": "CA", "address": "1 Benchmark Way",
+              "genres": ["Jazz"]}
+ARTIST_FORM = {"name": "Benchmark Artist", "city": "San Francisco", "state": "CA", "genres": ["Jazz"]}
+
+
+def route_case(method, url, form=None, indexes=(), full_scans=(), writes=False):
+    return RouteCase(method, url, form, tuple(indexes), set(full_scans), writes)
+
+
+def route_cases():
+    """One request or more for every route of the venues, artists, shows and API blueprints.
+
+    ``flask check-query-plans`` and ``flask bench routes`` both walk this list, and both
+    refuse to run while ``uncovered_endpoints`` reports a route that is missing from it.
+    Routes taking an id use the first venue and artist, so the database must be seeded.
+    """
+    venue_id = db.session.query(Venue.id).order_by(Venue.id).limit(1).scalar()
+    artist_id = db.session.query(Artist.id).order_by(Artist.id).limit(1).scalar()
+    today = date.today()
+    window = f'from={today}&to={today + timedelta(days=30)}'
+    cases = [
+        # the area summary lists every venue grouped by city, so it reads the whole table by design
+        route_case('GET', '/venues', full_scans={'venues'}),
+        # the A-Z index counts every artist by first letter; the page itself walks (name, id)
+        route_case('GET', '/artists', indexes={'ix_artists_name_id'}, full_scans={'artists'}),
+        route_case('GET', '/shows', indexes={SHOWS_PAGE}),
+        route_case('GET', '/shows?when=upcoming', indexes={SHOWS_PAGE}),
+        route_case('GET', '/shows?when=past', indexes={SHOWS_PAGE}),
+        route_case('GET', f'/shows?{window}', indexes={SHOWS_PAGE}),
+        route_case('POST', '/venues/search', {'search_term': 'hop'}, indexes={'ix_venues_name_trgm'}),
+        route_case('POST', '/venues/search', {'search_term': 'San Francisco, CA'},
+                   indexes={'ix_venues_city_trgm'}),
+        route_case('POST', '/artists/search', {'search_term': 'petals'}, indexes={'ix_artists_name_trgm'}),
+        route_case('GET', '/venues/available?city=San+Francisco&state=CA&genre=Jazz',
+                   indexes={'ix_venues_city_lower_state', VENUE_SHOWS}),
+        route_case('GET', '/venues/browse?genre=Jazz&state=CA', indexes={('ix_venues_genres', 'ix_venues_state')}),
+        route_case('GET', '/artists/browse?genre=Jazz&seeking=1', indexes={'ix_artists_genres'}),
+        route_case('GET', '/venues/create'),
+        route_case('GET', '/artists/create'),
+        route_case('GET', '/shows/create'),
+        # the list endpoints of the API export whole tables by design
+        route_case('GET', '/api/venues', full_scans={'venues'}),
+        route_case('GET', '/api/artists', full_scans={'artists'}),
+        route_case('GET', f'/api/shows?when=upcoming&{window}', indexes={SHOWS_PAGE}),
+        route_case('GET', '/api/venues/available?city=San+Francisco&state=CA',
+                   indexes={'ix_venues_city_lower_state', VENUE_SHOWS}),
+        route_case('GET', '/api/typeahead?q=hop', full_scans={'typeahead_changes'}),
+    ]
+    writes = [
+        route_case('POST', '/venues/create', VENUE_FORM, writes=True),
+        route_case('POST', '/artists/create', ARTIST_FORM, writes=True),
+    ]
+    if venue_id:
+        cases += [
+            route_case('GET', f'/venues/{venue_id}', indexes={'venues_pkey', VENUE_SHOWS}),
+            route_case('GET', f'/venues/{venue_id}/calendar?{window}', indexes={'venues_pkey', VENUE_SHOWS}),
+            route_case('GET', f'/venues/{venue_id}/edit', indexes={'venues_pkey'}),
+            route_case('GET', f'/api/venues/{venue_id}', indexes={'venues_pkey', VENUE_SHOWS}),
+            route_case('GET', f'/api/shows?venue_id={venue_id}', indexes={VENUE_SHOWS}),
+        ]
+        writes += [
+            route_case('POST', f'/venues/{venue_id}/edit', dict(VENUE_FORM, name='Benchmark Venue (edited)'),
+                       indexes={'venues_pkey', VENUE_SHOWS}, writes=True),
+            route_case('POST', f'/venues/{venue_id}', indexes={VENUE_SHOWS}, writes=True),
+            route_case('POST', '/venues/delete', {'venue_ids': [venue_id]}, indexes={VENUE_SHOWS}, writes=True),
+        ]
+    if artist_id:
+        cases += [
+            route_case('GET', f'/artists/{artist_id}', indexes={'artists_pkey', ARTIST_SHOWS}),
+            route_case('GET', f'/artists/{artist_id}/calendar?{window}', indexes={'artists_pkey', ARTIST_SHOWS}),
+            route_case('GET', f'/artists/{artist_id}/edit', indexes={'artists_pkey'}),
+            route_case('GET', f'/api/artists/{artist_id}', indexes={'artists_pkey', ARTIST_SHOWS}),
+        ]
+        writes += [
+            route_case('POST', f'/artists/{artist_id}/edit', dict(ARTIST_FORM, name='Benchmark Artist (edited)'),
+                       indexes={'artists_pkey', ARTIST_SHOWS}, writes=True),
+            route_case('POST', f'/artists/{artist_id}', indexes={ARTIST_SHOWS}, writes=True),
+            route_case('POST', '/artists/delete', {'artist_ids': [artist_id]}, indexes={ARTIST_SHOWS},
+                       writes=True),
+        ]
+    if venue_id and artist_id:
+        # well past the seeded shows, so the booking finds no conflict and inserts
+        start_time = (datetime.utcnow() + timedelta(days=3 * 365)).strftime('%Y-%m-%d %H:00:00')
+        writes.append(route_case('POST', '/shows/create',
+                                 {'venue_id': str(venue_id), 'artist_id': str(artist_id), 'start_time': start_time},
+                                 indexes={'venues_pkey', 'artists_pkey', VENUE_SHOWS, ARTIST_SHOWS}, writes=True))
+    # a write pins the client to the primary for a while, so the reads go first
+    return cases + writes
+
+
+def uncovered_endpoints(app, cases):
+    """Endpoints of the covered blueprints that no case in ``cases`` requests."""
+    adapter = app.url_map.bind('localhost')
+    covered = {adapter.match(urlsplit(case.url).path, method=case.method)[0] for case in cases}
+    return sorted({rule.endpoint for rule in app.url_map.iter_rules()
+                   if rule.endpoint.partition('.')[0] in COVERED_BLUEPRINTS and rule.endpoint not in covered})
+
+
+@contextmanager
+def rolled_back_session():
+    """Point ``db.session`` at one transaction on the primary that is rolled back on exit.
+
+    The request's own commits and rollbacks only end a savepoint, so a write route can be
+    replayed against the same data. Cache generations are still bumped on their own
+    connection, which only costs the in-process caches a refill.
+    """
+    connection = db.get_engine().connect()
+    transaction = connection.begin()
+    scoped_session = db.session
+    db.session = db.create_scoped_session(options={'bind': connection, 'binds': {}})
+    session = db.session()
+    session.begin_nested()
+
+    @event.listens_for(session, 'after_transaction_end')
+    def restart_savepoint(session, ended):
+        if ended.nested and not ended._parent.nested:
+            session.expire_all()
+            session.begin_nested()
+
+    try:
+        yield
+    finally:
+        db.session.remove()
+        db.session = scoped_session
+        transaction.rollback()
+        connection.close()
@@ -0,0 +1,60 @@
+import random
+import time
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# search forms are POSTed but never write
+READ_ONLY_ENDPOINTS = ('venues.search_venues', 'artists.search_artists')
+# files that never touch the database; reading the session would add Vary: Cookie to their shared cache entries
+SESSIONLESS_ENDPOINTS = ('static', 'dist_file')
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends read-only requests to a replica bind and everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None):
+        replica_binds = self.app.config['REPLICA_BINDS']
+        if self._flushing or not replica_binds or not (has_request_context() and g.get('read_from_replica')):
+            return super().get_bind(mapper, clause)
+        # pin one replica per request so a page never mixes snapshots from two replicas
+        if 'replica_bind' not in g:
+            g.replica_bind = random.choice(replica_binds)
+        return get_state(self.app).db.get_engine(self.app, bind=g.replica_bind)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def get_engines(app):
+    """The primary engine followed by the engine of every configured bind (the replicas)."""
+    db = get_state(app).db
+    return [db.get_engine(app, bind=bind) for bind in [None, *(app.config['SQLALCHEMY_BINDS'] or {})]]
+
+
+def init_read_routing(app):
+    """Route read-only requests to replicas, except shortly after the same client wrote.
+
+    After any write request the client's session is pinned to the primary for
+    ``READ_YOUR_WRITES_SECONDS`` so the redirect that follows sees its own changes.
+    """
+    stickiness = app.config['READ_YOUR_WRITES_SECONDS']
+
+    def is_read_only():
+        return request.method in READ_ONLY_METHODS or request.endpoint in READ_ONLY_ENDPOINTS
+
+    @app.before_request
+    def choose_database():
+        if request.endpoint in SESSIONLESS_ENDPOINTS:
+            return
+        g.read_from_replica = is_read_only() and session.get('read_primary_until', 0) < time.time()
+
+    @app.after_request
+    def stick_to_primary_after_write(response):
+        if not is_read_only() and request.endpoint not in SESSIONLESS_ENDPOINTS:
+            session['read_primary_until'] = time.time() + stickiness
+        return response
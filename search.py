@@ -0,0 +1,41 @@
+from flask import current_app
+from sqlalchemy import func, and_, or_
+
+from models import db
+
+
+def search_by_name_or_location(model, search_term):
+    """Ranked, case-insensitive search over ``model`` name, city and state.
+
+    The ``ILIKE`` filters are served by the pg_trgm GIN indexes, so no sequential scan is
+    needed. A term like "San Francisco, CA" is matched against city and state instead.
+    Upcoming show counts come from the denormalized counter column.
+    """
+    search_term = search_term.strip()
+
+    if ',' in search_term:
+        city, state = (part.strip() for part in search_term.rsplit(',', 1))
+        match = and_(model.city.ilike(city), model.state.ilike(state))
+        rank = func.similarity(model.city, city)
+    else:
+        like_search_term = "%{}%".format(search_term)
+        match = or_(model.name.ilike(like_search_term),
+                    model.city.ilike(like_search_term),
+                    model.state.ilike(search_term))
+        rank = func.greatest(func.similarity(model.name, search_term),
+                             func.similarity(model.city, search_term))
+
+    rows = db.session.query(model.id, model.name, model.upcoming_shows_count) \
+        .filter(match) \
+        .order_by(rank.desc(), model.name, model.id) \
+        .limit(current_app.config['SEARCH_RESULT_LIMIT']) \
+        .all()
+
+    return {
+        "count": len(rows),
+        "data": [{
+            "id": row[0],
+            "name": row[1],
+            "num_upcoming_shows": row[2]
+        } for row in rows]
+    }
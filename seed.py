@@ -0,0 +1,123 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+
+from area_summary import invalidate_area_summary
+from counters import refresh_all_upcoming_counters
+from forms import VenueForm
+from models import db, Venue, Artist, VenueArtistShow
+from page_cache import invalidate_all_pages
+from typeahead import record_new_entities
+
+SCALES = {
+    'small': 1000,
+    'medium': 100000,
+    'large': 1000000,
+}
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('Oakland', 'CA'), ('New York', 'NY'), ('Brooklyn', 'NY'),
+    ('Austin', 'TX'), ('Houston', 'TX'), ('Nashville', 'TN'), ('Memphis', 'TN'), ('Chicago', 'IL'),
+    ('Seattle', 'WA'), ('Portland', 'OR'), ('Denver', 'CO'), ('New Orleans', 'LA'), ('Atlanta', 'GA'),
+    ('Boston', 'MA'), ('Detroit', 'MI'), ('Minneapolis', 'MN'), ('Philadelphia', 'PA'), ('Miami', 'FL'),
+]
+GENRES = [choice[0] for choice in VenueForm.genres.kwargs['choices']]
+ADJECTIVES = ['Blue', 'Electric', 'Velvet', 'Golden', 'Midnight', 'Silver', 'Wild', 'Crimson', 'Lucky', 'Hollow',
+              'Neon', 'Quiet', 'Rusty', 'Still', 'Broken', 'Little', 'Grand', 'Paper', 'Iron', 'Sunday']
+NOUNS = ['Hop', 'Room', 'Owl', 'Garden', 'Petals', 'Lantern', 'Tigers', 'Harbor', 'Cellar', 'Echo',
+         'Foxes', 'Parlor', 'Wolves', 'Station', 'Mirrors', 'Orchard', 'Ballroom', 'Sparrows', 'Tavern', 'Hall']
+
+
+def random_name(rng):
+    return f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.randint(1, 9999)}"
+
+
+def random_phone(rng):
+    return f"{rng.randint(200, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}"
+
+
+def fake_venue(rng):
+    city, state = rng.choice(CITIES)
+    return {
+        "name": random_name(rng),
+        "city": city,
+        "state": state,
+        "address": f"{rng.randint(1, 9999)} {rng.choice(NOUNS)} Street",
+        "phone": random_phone(rng),
+        "genres": rng.sample(GENRES, rng.randint(1, 3)),
+        "facebook_link": None,
+        "image_link": f"https://picsum.photos/seed/venue{rng.randint(1, 10 ** 6)}/400/300",
+        "website_link": None,
+        "seeking_talent": rng.random() < 0.3,
+        "seeking_description": None,
+    }
+
+
+def fake_artist(rng):
+    city, state = rng.choice(CITIES)
+    return {
+        "name": random_name(rng),
+        "city": city,
+        "state": state,
+        "phone": random_phone(rng),
+        "genres": rng.sample(GENRES, rng.randint(1, 3)),
+        "facebook_link": None,
+        "image_link": f"https://picsum.photos/seed/artist{rng.randint(1, 10 ** 6)}/400/300",
+        "website_link": None,
+        "seeking_venue": rng.random() < 0.3,
+        "seeking_description": None,
+    }
+
+
+def insert_in_batches(model, make_row, count, batch_size):
+    for offset in range(0, count, batch_size):
+        rows = [make_row() for _ in range(min(batch_size, count - offset))]
+        db.session.execute(model.__table__.insert(), rows)
+        db.session.commit()
+
+
+@click.command('seed')
+@click.option('--scale', type=click.Choice(sorted(SCALES, key=SCALES.get)), default='small', show_default=True,
+              help='Number of shows to generate: small 1k, medium 100k, large 1M.')
+@click.option('--shows', type=int, help='Exact number of shows, overrides --scale.')
+@click.option('--random-seed', default=42, show_default=True)
+@click.option('--batch-size', default=10000, show_default=True)
+@with_appcontext
+def seed_command(scale, shows, random_seed, batch_size):
+    """Fill the database with synthetic venues, artists and shows.
+
+    One venue per 20 shows and one artist per 10 shows are created; show times are
+    spread over two years either side of now so past/upcoming splits are realistic.
+    """
+    rng = random.Random(random_seed)
+    shows = shows or SCALES[scale]
+    venues = max(1, shows // 20)
+    artists = max(1, shows // 10)
+    start = time.perf_counter()
+
+    last_ids = {model: db.session.query(func.coalesce(func.max(model.id), 0)).scalar() for model in (Venue, Artist)}
+    insert_in_batches(Venue, lambda: fake_venue(rng), venues, batch_size)
+    insert_in_batches(Artist, lambda: fake_artist(rng), artists, batch_size)
+    # running workers add the new names to their typeahead index from these records
+    record_new_entities('venue', Venue, last_ids[Venue])
+    record_new_entities('artist', Artist, last_ids[Artist])
+    db.session.commit()
+    click.echo(f'{venues} venues and {artists} artists ({time.perf_counter() - start:.1f}s)')
+
+    venue_ids = [row[0] for row in db.session.query(Venue.id)]
+    artist_ids = [row[0] for row in db.session.query(Artist.id)]
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    insert_in_batches(VenueArtistShow, lambda: {
+        "venue_id": rng.choice(venue_ids),
+        "artist_id": rng.choice(artist_ids),
+        "start_time": now + timedelta(hours=rng.randint(-2 * 365 * 24, 2 * 365 * 24)),
+    }, shows, batch_size)
+    click.echo(f'{shows} shows ({time.perf_counter() - start:.1f}s)')
+
+    refresh_all_upcoming_counters()
+    invalidate_area_summary()
+    invalidate_all_pages()
@@ -1,27 +1,77 @@
-from flask import Blueprint, render_template, flash
+from datetime import datetime
+from functools import partial
+
+from flask import Blueprint, render_template, flash, request, url_for
 from sqlalchemy.exc import SQLAlchemyError
 
+from area_summary import invalidate_area_summary
+from bookings import book_shows, expand_recurrence
 from forms import ShowForm
 from models import db, Venue, VenueArtistShow, Artist
+from page_cache import cached_page, invalidate_after_commit, invalidate_pages
+from pagination import keyset_query, keyset_page, get_page_size
+from timeline import get_time_window, filter_time_window, group_by_day
 
 shows_blueprint = Blueprint('shows', __name__, url_prefix='')
 
 
+def shows_page_query(page_size):
+    now = datetime.utcnow()
+    when = request.args.get('when', 'all')
+    start, end = get_time_window()
+
+    query = db.session.query(VenueArtistShow.id,
+                             VenueArtistShow.venue_id,
+                             Venue.name,
+                             VenueArtistShow.artist_id,
+                             Artist.name,
+                             Artist.image_link,
+                             VenueArtistShow.start_time,
+                             Venue.version,
+                             Artist.version) \
+        .join(Venue, Venue.id == VenueArtistShow.venue_id) \
+        .join(Artist, Artist.id == VenueArtistShow.artist_id)
+    if when == 'upcoming':
+        query = query.filter(VenueArtistShow.start_time >= now)
+    elif when == 'past':
+        query = query.filter(VenueArtistShow.start_time < now)
+    # range scan on the (start_time, id) btree that also serves the keyset ordering
+    query = filter_time_window(query, VenueArtistShow.start_time, start, end)
+
+    return keyset_query(query,
+                        key_columns=(VenueArtistShow.start_time, VenueArtistShow.id),
+                        key_types=(datetime, int),
+                        cursor=request.args.get('after'),
+                        page_size=page_size)
+
+
+def render_shows(rows, page_size):
+    when = request.args.get('when', 'all')
+    page = keyset_page(rows, row_key=lambda row: (row[6], row[0]), page_size=page_size)
+    data = [{
+        "id": row[0],
+        "venue_id": row[1],
+        "venue_name": row[2],
+        "artist_id": row[3],
+        "artist_name": row[4],
+        "artist_image_link": row[5],
+        "start_time": row[6],
+        "venue_version": row[7],
+        "artist_version": row[8]
+    } for row in page.items]
+
+    next_url = None
+    if page.next_cursor:
+        next_url = url_for('shows.shows', when=when, limit=page_size, after=page.next_cursor,
+                           **{key: request.args[key] for key in ('from', 'to') if request.args.get(key)})
+    return render_template('pages/shows.html', days=group_by_day(data), when=when, next_url=next_url)
+
+
 @shows_blueprint.route('/shows')
+@cached_page('shows')
 def shows():
-    venue_artist_shows = db.session.query(VenueArtistShow).all()
-
-    data = []
-    for venue_artist_show in venue_artist_shows:
-        data.append({
-            "venue_id": venue_artist_show.venue_id,
-            "venue_name": Venue.query.filter_by(id=venue_artist_show.venue_id).first().name,
-            "artist_id": venue_artist_show.artist_id,
-            "artist_name": Artist.query.filter_by(id=venue_artist_show.artist_id).first().name,
-            "artist_image_link": Artist.query.filter_by(id=venue_artist_show.artist_id).first().image_link,
-            "start_time": str(venue_artist_show.start_time)
-        })
-    return render_template('pages/shows.html', shows=data)
+    page_size = get_page_size('SHOWS_PAGE_SIZE')
+    return render_shows(shows_page_query(page_size).all(), page_size)
 
 
 @shows_blueprint.route('/shows/create')
@@ -33,21 +83,39 @@ def create_shows():
 
 @shows_blueprint.route('/shows/create', methods=['POST'])
 def create_show_submission():
-    form = ShowForm()
+    form = ShowForm(request.form, meta={'csrf': False})
+    ids_valid = (form.venue_id.data or '').isdigit() and (form.artist_id.data or '').isdigit()
+
+    if not form.validate_on_submit() or not ids_valid:
+        if not ids_valid:
+            flash('Venue ID and artist ID must be numbers.')
+        for key, value in form.errors.items():
+            flash(f"{key}: {value}\n")
+        return render_template('forms/new_show.html', form=form)
 
-    show = VenueArtistShow(
-        venue_id=form.venue_id.data,
-        artist_id=form.artist_id.data,
-        start_time=form.start_time.data
-    )
+    venue_id = int(form.venue_id.data)
+    artist_id = int(form.artist_id.data)
+    start_times = expand_recurrence(form.start_time.data, form.repeat.data,
+                                    occurrences=form.occurrences.data or 1, interval=form.every.data or 1)
 
     try:
-        db.session.add(show)
+        # every date of a residency is listed in one transaction, or none of them is
+        problems = book_shows(venue_id, artist_id, start_times)
+        if problems:
+            db.session.rollback()
+            for problem in problems:
+                flash(problem)
+            return render_template('forms/new_show.html', form=form)
         db.session.commit()
-        flash('Show was successfully listed!')
     except SQLAlchemyError:
         flash('An error occurred. Show could not be listed.')
         db.session.rollback()
+    else:
+        invalidate_after_commit(invalidate_area_summary,
+                                partial(invalidate_pages, f'venue:{venue_id}', f'artist:{artist_id}', 'shows',
+                                        'venues'))
+        flash(f'{len(start_times)} show(s) successfully listed!' if len(start_times) > 1
+              else 'Show was successfully listed!')
     finally:
         db.session.close()
 
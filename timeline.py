@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+
+from flask import abort, current_app, request
+from sqlalchemy import func, literal, select, union_all
+
+from models import VenueArtistShow
+
+
+def get_past_shows_limit():
+    return request.args.get('past_limit', current_app.config['DETAIL_PAST_SHOWS_LIMIT'], type=int)
+
+
+def detail_shows_lateral(columns, from_obj, show_fk, entity_id, now, past_limit):
+    """Every upcoming show and the ``past_limit`` most recent past shows of one entity, as a LATERAL subquery.
+
+    ``show_fk`` is the show column pointing at the entity, compared with the correlated
+    ``entity_id``. Both halves are range scans on the (fk, start_time) index, the past one
+    read backwards and stopped after ``past_limit`` rows. Rows are flagged ``upcoming``; the
+    union does not keep either half's order.
+    """
+    def shows(upcoming):
+        query = select([literal(upcoming).label('upcoming'), *columns, VenueArtistShow.start_time]) \
+            .select_from(from_obj) \
+            .where(show_fk == entity_id)
+        if upcoming:
+            return query.where(VenueArtistShow.start_time >= now)
+        return query.where(VenueArtistShow.start_time < now) \
+            .order_by(VenueArtistShow.start_time.desc()) \
+            .limit(max(past_limit, 0))
+
+    return union_all(shows(True), shows(False)).lateral('shows')
+
+
+def past_shows_count(show_fk, entity_id, now):
+    return select([func.count(VenueArtistShow.id)]) \
+        .where(show_fk == entity_id) \
+        .where(VenueArtistShow.start_time < now) \
+        .scalar_subquery()
+
+
+def split_detail_shows(rows, make_show):
+    """Upcoming shows in chronological order and past shows newest first, from rows ending with
+    the columns of ``detail_shows_lateral``; ``make_show`` builds the show dict of one row."""
+    upcoming = []
+    past = []
+    for row in rows:
+        if row[-1] is None:
+            continue
+        (upcoming if row.upcoming else past).append(row)
+    upcoming.sort(key=lambda row: row[-1])
+    past.sort(key=lambda row: row[-1], reverse=True)
+    return [make_show(row) for row in upcoming], [make_show(row) for row in past]
+
+
+def parse_time_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None, False
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None, False
+    # start times are stored as naive UTC, so an offset is applied and dropped rather than compared against
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed, len(value) == 10
+
+
+def get_time_window(default_days=None):
+    """Read the ``from``/``to`` query arguments as a half-open ``[start, end)`` window.
+
+    Both accept ISO dates or datetimes, naive ones being UTC; a plain date in ``to``
+    includes that whole day. Without ``from`` the window starts today when ``default_days``
+    is given. Without ``to`` the window ends ``CALENDAR_MAX_DAYS`` after ``from``, and a
+    longer window that was asked for is rejected with a 400.
+    """
+    start, _ = parse_time_arg('from')
+    end, end_is_date = parse_time_arg('to')
+    if end is not None and end_is_date:
+        end += timedelta(days=1)
+    if start is None and default_days is not None:
+        start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if end is None and start is not None and default_days is not None:
+        end = start + timedelta(days=default_days)
+    if start is not None:
+        max_days = current_app.config['CALENDAR_MAX_DAYS']
+        max_end = start + timedelta(days=max_days)
+        if end is None:
+            end = max_end
+        elif end > max_end:
+            abort(400, description=f'The time window may span at most {max_days} days.')
+    return start, end
+
+
+def last_day(end):
+    # the last date inside a half-open window ending at ``end``
+    return (end - timedelta(microseconds=1)).date()
+
+
+def filter_time_window(query, column, start, end):
+    if start is not None:
+        query = query.filter(column >= start)
+    if end is not None:
+        query = query.filter(column < end)
+    return query
+
+
+def group_by_day(shows):
+    """Group shows already sorted by ``start_time`` into days in a single pass."""
+    return [{
+        "date": day,
+        "shows": list(day_shows)
+    } for day, day_shows in groupby(shows, key=lambda show: show["start_time"].date())]
@@ -0,0 +1,239 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import func, literal, select
+
+from models import db, Venue, Artist, TypeaheadChange
+
+TYPEAHEAD_MODELS = (
+    ('venue', Venue),
+    ('artist', Artist),
+)
+
+
+def normalize(text):
+    return ' '.join((text or '').casefold().split())
+
+
+class TypeaheadIndex:
+    """In-process prefix index over artist and venue names and the cities they are in.
+
+    Every suggestion is a ``(key, kind, ref, label)`` tuple in one sorted list, ``key`` being
+    the normalized text. A lookup bisects to the first key at or after the prefix and reads
+    forward while keys still start with it, so its cost depends on the number of results,
+    not on the size of the index. A city is listed once however many venues and artists are
+    in it.
+
+    The index is built once per process at startup and only ever updated entry by entry
+    afterwards. Create, edit and delete handlers update the copy of the process that served
+    them and record the change in ``typeahead_changes``; ``sync`` replays those records in
+    every other process, so no request ever waits for the whole index to be loaded.
+    """
+
+    def __init__(self):
+        self.built_at = None
+        self._entries = []
+        self._entities = {}
+        self._cities = {}
+        self._lock = threading.Lock()
+        # updates made while ``load`` reads rows, replayed onto the new index once it is swapped in
+        self._pending = None
+        self._change_id = 0
+        self._synced_at = 0.0
+        self._syncing = False
+
+    def build(self):
+        """Load every venue and artist in one pass over each table and swap the new index in."""
+        chunk_size = current_app.config['API_STREAM_CHUNK_SIZE']
+        # every change up to here has committed, so the rows read below include it; later ones are replayed
+        change_id = db.session.query(func.coalesce(func.max(TypeaheadChange.id), 0)) \
+            .filter(TypeaheadChange.changed_at < settled_before()) \
+            .scalar()
+        self.load((kind, db.session.query(model.id, model.name, model.city, model.state)
+                   .execution_options(stream_results=True)
+                   .yield_per(chunk_size))
+                  for kind, model in TYPEAHEAD_MODELS)
+        self._change_id = change_id
+        self._synced_at = time.monotonic()
+
+    def load(self, rows_by_kind):
+        """Replace the index with ``(kind, rows)`` pairs of ``(id, name, city, state)`` rows."""
+        with self._lock:
+            self._pending = []
+        entries = []
+        entities = {}
+        cities = {}
+        try:
+            for kind, rows in rows_by_kind:
+                for entity_id, name, city, state in rows:
+                    entry = (normalize(name), kind, entity_id, name)
+                    entries.append(entry)
+                    entities[(kind, entity_id)] = (entry, (city, state))
+                    cities[(city, state)] = cities.get((city, state), 0) + 1
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        entries.extend(self._city_entry(city, state) for city, state in cities)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._entities = entities
+            self._cities = cities
+            self.built_at = time.monotonic()
+            pending, self._pending = self._pending, None
+            for update in pending:
+                update()
+
+    def sync(self):
+        """Apply the changes other processes recorded since the last sync.
+
+        Runs at most once every ``TYPEAHEAD_SYNC_SECONDS`` per process, and in one request at
+        a time; the others keep answering from the index as it is. Each run reads at most
+        ``TYPEAHEAD_SYNC_BATCH`` changes and the rows they point at, both from the primary.
+        """
+        config = current_app.config
+        with self._lock:
+            if self.built_at is None or self._syncing \
+                    or time.monotonic() - self._synced_at < config['TYPEAHEAD_SYNC_SECONDS']:
+                return
+            self._syncing = True
+        try:
+            with db.engine.connect() as connection:
+                changes = connection.execute(
+                    select([TypeaheadChange.id, TypeaheadChange.kind, TypeaheadChange.entity_id])
+                    .where(TypeaheadChange.id > self._change_id)
+                    .where(TypeaheadChange.changed_at < settled_before())
+                    .order_by(TypeaheadChange.id)
+                    .limit(config['TYPEAHEAD_SYNC_BATCH'])
+                ).all()
+                for kind, model in TYPEAHEAD_MODELS:
+                    entity_ids = {entity_id for _, change_kind, entity_id in changes if change_kind == kind}
+                    if not entity_ids:
+                        continue
+                    rows = connection.execute(select([model.id, model.name, model.city, model.state])
+                                              .where(model.id.in_(entity_ids))).all()
+                    for row in rows:
+                        self.update(kind, *row)
+                    self.discard(kind, *(entity_ids - {row[0] for row in rows}))
+            if changes:
+                self._change_id = changes[-1][0]
+            self._synced_at = time.monotonic()
+        finally:
+            self._syncing = False
+
+    def lookup(self, prefix, limit):
+        key = normalize(prefix)
+        if not key:
+            return []
+        with self._lock:
+            position = bisect_left(self._entries, (key,))
+            matches = []
+            while position < len(self._entries) and len(matches) < limit:
+                entry = self._entries[position]
+                if not entry[0].startswith(key):
+                    break
+                matches.append(entry)
+                position += 1
+        return matches
+
+    def update(self, kind, entity_id, name, city, state):
+        """Add a created entity, or move an edited one to its new name and city."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(lambda: self._update(kind, entity_id, name, city, state))
+            if self.built_at is not None:
+                self._update(kind, entity_id, name, city, state)
+
+    def discard(self, kind, *entity_ids):
+        with self._lock:
+            for entity_id in entity_ids:
+                if self._pending is not None:
+                    self._pending.append(lambda entity_id=entity_id: self._discard(kind, entity_id))
+                if self.built_at is not None:
+                    self._discard(kind, entity_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._entities = {}
+            self._cities = {}
+            self.built_at = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "entities": len(self._entities),
+                "cities": len(self._cities),
+                "age_seconds": None if self.built_at is None else round(time.monotonic() - self.built_at, 1),
+                "change_id": self._change_id,
+            }
+
+    def _update(self, kind, entity_id, name, city, state):
+        self._discard(kind, entity_id)
+        entry = (normalize(name), kind, entity_id, name)
+        insort(self._entries, entry)
+        self._entities[(kind, entity_id)] = (entry, (city, state))
+        count = self._cities.get((city, state), 0)
+        if not count:
+            insort(self._entries, self._city_entry(city, state))
+        self._cities[(city, state)] = count + 1
+
+    def _discard(self, kind, entity_id):
+        found = self._entities.pop((kind, entity_id), None)
+        if found is None:
+            return
+        entry, city_state = found
+        self._remove_entry(entry)
+        count = self._cities.get(city_state, 0) - 1
+        if count > 0:
+            self._cities[city_state] = count
+        else:
+            self._cities.pop(city_state, None)
+            self._remove_entry(self._city_entry(*city_state))
+
+    def _remove_entry(self, entry):
+        position = bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    @staticmethod
+    def _city_entry(city, state):
+        return normalize(city), 'city', (city, state), f'{city}, {state}'
+
+
+def settled_before():
+    # ids are handed out before commit, so a change is only replayed once any lower id has had time to commit
+    return func.localtimestamp() - timedelta(seconds=current_app.config['TYPEAHEAD_SYNC_DELAY'])
+
+
+def record_changes(kind, *entity_ids):
+    """Record created, edited or deleted entities for other processes, in the caller's transaction."""
+    if not entity_ids:
+        return
+    db.session.execute(TypeaheadChange.__table__.insert(),
+                       [{"kind": kind, "entity_id": entity_id} for entity_id in entity_ids])
+    forget_old_changes()
+
+
+def record_new_entities(kind, model, after_id):
+    """Record every row of ``model`` with an id above ``after_id``, for bulk inserts."""
+    db.session.execute(TypeaheadChange.__table__.insert().from_select(
+        ['kind', 'entity_id'],
+        select([literal(kind), model.id]).where(model.id > after_id)
+    ))
+    forget_old_changes()
+
+
+def forget_old_changes():
+    retention = timedelta(hours=current_app.config['TYPEAHEAD_CHANGES_RETENTION_HOURS'])
+    db.session.query(TypeaheadChange) \
+        .filter(TypeaheadChange.changed_at < func.localtimestamp() - retention) \
+        .delete(synchronize_session=False)
+
+
+typeahead_index = TypeaheadIndex()
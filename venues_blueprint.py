@@ -1,97 +1,132 @@
 from datetime import datetime
+from functools import partial
 
-from flask import Blueprint, render_template, request, flash, url_for
-from sqlalchemy import func
+from flask import Blueprint, render_template, request, flash, url_for, abort, current_app
+from sqlalchemy import and_, func, true
 from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.utils import redirect
 
+from area_summary import get_area_summary, invalidate_area_summary
+from bookings import available_venues_query
+from counters import refresh_upcoming_counters
+from facets import browse
 from forms import VenueForm
-from models import db, Venue, VenueArtistShow, Artist
+from models import db, Venue, VenueArtistShow, Artist, delete_by_ids, update_changed
+from page_cache import cached_page, invalidate_after_commit, invalidate_pages
+from search import search_by_name_or_location
+from timeline import get_past_shows_limit, get_time_window, group_by_day, last_day, detail_shows_lateral, \
+    past_shows_count, split_detail_shows
+from typeahead import record_changes, typeahead_index
 
 venues_blueprint = Blueprint('venues', __name__, url_prefix='')
 
 
+def played_artist_ids(venue_ids):
+    rows = db.session.query(VenueArtistShow.artist_id) \
+        .filter(VenueArtistShow.venue_id.in_(venue_ids)) \
+        .distinct() \
+        .all()
+    return [row[0] for row in rows]
+
+
+def invalidate_venue_pages(*venue_ids, artist_ids=None):
+    # the venue name also appears on the pages of every artist that played there
+    if artist_ids is None:
+        artist_ids = played_artist_ids(venue_ids)
+    invalidate_pages('venues', 'shows',
+                     *(f'venue:{venue_id}' for venue_id in venue_ids),
+                     *(f'artist:{artist_id}' for artist_id in artist_ids))
+
+
+def delete_venues(venue_ids):
+    """Delete the venues and commit; returns how many were deleted and the artists that played there."""
+    # read before the cascade removes the shows that link them
+    artist_ids = played_artist_ids(venue_ids)
+    deleted = delete_by_ids(Venue, venue_ids)
+    # the cascade removed shows of these artists too
+    if artist_ids:
+        refresh_upcoming_counters(Artist, VenueArtistShow.artist_id, artist_ids)
+    record_changes('venue', *venue_ids)
+    db.session.commit()
+    return deleted, artist_ids
+
+
+def forget_deleted_venues(venue_ids, artist_ids):
+    invalidate_after_commit(partial(invalidate_venue_pages, *venue_ids, artist_ids=artist_ids),
+                            invalidate_area_summary)
+    typeahead_index.discard('venue', *venue_ids)
+
+
 @venues_blueprint.route('/venues')
+@cached_page('venues')
 def venues():
-    now = datetime.utcnow()
-    city_state_list = db.session.query(Venue.city, Venue.state) \
-        .group_by(Venue.city, Venue.state) \
-        .all()
+    return render_template('pages/venues.html', areas=get_area_summary())
+
 
-    data = [
-        {
-            "city": city_state[0],
-            "state": city_state[1],
-            "venues": db.session.query(Venue.id, Venue.name)
-                .filter(Venue.city == city_state[0], Venue.state == city_state[1])
-                .all()
-        } for city_state in city_state_list
-    ]
-    for city_state_group in data:
-        city_state_group["venues"] = [
-            {
-                "id": venue_id_name[0],
-                "name": venue_id_name[1],
-                "num_upcoming_shows": db.session.query(VenueArtistShow.id)
-                    .filter(VenueArtistShow.start_time > now, VenueArtistShow.venue_id == venue_id_name[0])
-                    .count()
-            } for venue_id_name in city_state_group["venues"]
-        ]
-    return render_template('pages/venues.html', areas=data)
+@venues_blueprint.route('/venues/browse')
+@cached_page('venues')
+def browse_venues():
+    data = browse(Venue, Venue.seeking_talent, 'venues.browse_venues',
+                  link=lambda venue_id: url_for('venues.show_venue', venue_id=venue_id))
+    return render_template('pages/browse.html', title='Venues', icon='fa-music', **data)
 
 
 @venues_blueprint.route('/venues/search', methods=['POST'])
 def search_venues():
-    now = datetime.utcnow()
-    like_search_term = "%{}%".format(request.form.get('search_term', ''))
-    venue_list = db.session.query(Venue.id, Venue.name, func.count(VenueArtistShow.id)) \
-        .join(VenueArtistShow, VenueArtistShow.venue_id == Venue.id) \
-        .filter(VenueArtistShow.start_time > now, Venue.name.ilike(like_search_term)) \
-        .group_by(Venue.id, Venue.name) \
-        .all()
-    response = {
-        "count": len(venue_list),
-        "data": [{
-            "id": venue[0],
-            "name": venue[1],
-            "num_upcoming_shows": venue[2]
-        } for venue in venue_list]
-    }
+    response = search_by_name_or_location(Venue, request.form.get('search_term', ''))
     return render_template('pages/search_venues.html',
                            results=response,
                            search_term=request.form.get('search_term', '')
                            )
 
 
-@venues_blueprint.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    now = datetime.utcnow()
-    venue = Venue.query.get(venue_id)
-    upcoming_shows = list(map(lambda element: {
-        "artist_id": element[0],
-        "artist_name": element[1],
-        "artist_image_link": element[2],
-        "start_time": str(element[3])
-    }, db.session.query(VenueArtistShow.artist_id,
-                        Artist.name,
-                        Artist.image_link,
-                        VenueArtistShow.start_time)
-                              .join(Artist, Artist.id == VenueArtistShow.artist_id)
-                              .filter(VenueArtistShow.venue_id == venue_id, VenueArtistShow.start_time >= now)
-                              .all()))
-
-    past_shows = list(map(lambda element: {
-        "artist_id": element[0],
-        "artist_name": element[1],
-        "artist_image_link": element[2],
-        "start_time": str(element[3])
-    }, db.session.query(VenueArtistShow.artist_id,
-                        Artist.name,
-                        Artist.image_link,
-                        VenueArtistShow.start_time)
-                          .join(Artist, Artist.id == VenueArtistShow.artist_id)
-                          .filter(VenueArtistShow.venue_id == venue_id, VenueArtistShow.start_time < now)
-                          .all()))
+@venues_blueprint.route('/venues/available')
+def available_venues():
+    start, end = get_time_window(default_days=1)
+    city = request.args.get('city', '')
+    venues = []
+    if city.strip():
+        rows = available_venues_query(city, request.args.get('state'), request.args.get('genre'), start, end) \
+            .limit(current_app.config['SEARCH_RESULT_LIMIT']) \
+            .all()
+        venues = [{
+            "id": row[0],
+            "name": row[1],
+            "city": row[2],
+            "state": row[3],
+            "genres": row[4],
+            "seeking_talent": row[5]
+        } for row in rows]
+    return render_template('pages/available_venues.html',
+                           venues=venues,
+                           start=start,
+                           end=end,
+                           states=[choice[0] for choice in VenueForm.state.kwargs['choices']],
+                           genres=[choice[0] for choice in VenueForm.genres.kwargs['choices']])
+
+
+def venue_detail_query(venue_id, now, past_limit):
+    # one statement: the venue, its past show count and its shows, one row per show (or one without)
+    shows = detail_shows_lateral([VenueArtistShow.artist_id, Artist.name, Artist.image_link],
+                                 VenueArtistShow.__table__.outerjoin(Artist, Artist.id == VenueArtistShow.artist_id),
+                                 VenueArtistShow.venue_id, Venue.id, now, past_limit)
+    return db.session.query(Venue, past_shows_count(VenueArtistShow.venue_id, Venue.id, now), *shows.c) \
+        .outerjoin(shows, true()) \
+        .filter(Venue.id == venue_id)
+
+
+def venue_detail_from_rows(rows):
+    if not rows:
+        return None
+
+    venue = rows[0][0]
+    past_shows_count = rows[0][1]
+    upcoming_shows, past_shows = split_detail_shows(rows, lambda row: {
+        "artist_id": row[3],
+        "artist_name": row[4],
+        "artist_image_link": row[5],
+        "start_time": row[6]
+    })
 
     data = {
         "id": venue.id,
@@ -108,13 +143,60 @@ def show_venue(venue_id):
         "image_link": venue.image_link,
         "past_shows": past_shows,
         "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
+        "past_shows_count": past_shows_count,
         "upcoming_shows_count": len(upcoming_shows)
     }
+    return data
+
+
+def get_venue_detail(venue_id, past_limit):
+    return venue_detail_from_rows(venue_detail_query(venue_id, datetime.utcnow(), past_limit).all())
 
+
+@venues_blueprint.route('/venues/<int:venue_id>')
+@cached_page('venue:{venue_id}')
+def show_venue(venue_id):
+    data = get_venue_detail(venue_id, get_past_shows_limit())
+    if data is None:
+        abort(404)
     return render_template('pages/show_venue.html', venue=data)
 
 
+@venues_blueprint.route('/venues/<int:venue_id>/calendar')
+@cached_page('venue:{venue_id}')
+def venue_calendar(venue_id):
+    start, end = get_time_window(current_app.config['CALENDAR_DEFAULT_DAYS'])
+    # range scan on the (venue_id, start_time) index, grouped into days in one pass
+    rows = db.session.query(Venue.name,
+                            VenueArtistShow.artist_id,
+                            Artist.name,
+                            Artist.image_link,
+                            VenueArtistShow.start_time) \
+        .outerjoin(VenueArtistShow, and_(VenueArtistShow.venue_id == Venue.id,
+                                         VenueArtistShow.start_time >= start,
+                                         VenueArtistShow.start_time < end)) \
+        .outerjoin(Artist, Artist.id == VenueArtistShow.artist_id) \
+        .filter(Venue.id == venue_id) \
+        .order_by(VenueArtistShow.start_time) \
+        .all()
+    if not rows:
+        abort(404)
+
+    shows = [{
+        "id": row[1],
+        "name": row[2],
+        "image_link": row[3],
+        "link": url_for('artists.show_artist', artist_id=row[1]),
+        "start_time": row[4]
+    } for row in rows if row[4] is not None]
+    return render_template('pages/calendar.html',
+                           title=rows[0][0],
+                           link=url_for('venues.show_venue', venue_id=venue_id),
+                           start=start,
+                           last_day=last_day(end),
+                           days=group_by_day(shows))
+
+
 @venues_blueprint.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
@@ -143,13 +225,19 @@ def create_venue_submission():
                 seeking_description=form.seeking_description.data,
             )
             db.session.add(venue)
+            db.session.flush()
+            venue_id = venue.id
+            record_changes('venue', venue_id)
             db.session.commit()
-            # on successful db insert, flash success
-            flash('Venue ' + venue.name + ' was successfully listed!')
-            return render_template('pages/home.html')
         except SQLAlchemyError:
             flash(f"An error occurred. Venue{f' {name} ' if name else ' '}could not be listed.")
             db.session.rollback()
+        else:
+            invalidate_after_commit(invalidate_area_summary, partial(invalidate_pages, 'venues'))
+            typeahead_index.update('venue', venue_id, name, form.city.data, form.state.data)
+            # on successful db insert, flash success
+            flash('Venue ' + name + ' was successfully listed!')
+            return render_template('pages/home.html')
         finally:
             db.session.close()
 
@@ -158,15 +246,39 @@ def create_venue_submission():
     return render_template('forms/new_venue.html', form=form)
 
 
-@venues_blueprint.route('/venues/<venue_id>', methods=['POST'])
+@venues_blueprint.route('/venues/<int:venue_id>', methods=['POST'])
 def delete_venue(venue_id):
     try:
-        Venue.query.filter_by(id=venue_id).first_or_404().delete()
-        db.session.commit()
+        deleted, artist_ids = delete_venues([venue_id])
+    except SQLAlchemyError:
+        flash('It was not possible to delete this Venue')
+        db.session.rollback()
+    else:
+        if not deleted:
+            abort(404)
+        forget_deleted_venues([venue_id], artist_ids)
         flash('The venue has been removed together with all of its shows.')
         return render_template('pages/home.html')
+    finally:
+        db.session.close()
+    return redirect(url_for('venues.venues'))
+
+
+@venues_blueprint.route('/venues/delete', methods=['POST'])
+def delete_venues_submission():
+    venue_ids = request.form.getlist('venue_ids', type=int)
+    try:
+        deleted, artist_ids = delete_venues(venue_ids) if venue_ids else (0, [])
     except SQLAlchemyError:
-        flash('It was not possible to delete this Venue')
+        flash('It was not possible to delete these Venues')
+        db.session.rollback()
+    else:
+        if deleted:
+            forget_deleted_venues(venue_ids, artist_ids)
+        flash(f'{deleted} venue(s) have been removed together with all of their shows.')
+        return render_template('pages/home.html')
+    finally:
+        db.session.close()
     return redirect(url_for('venues.venues'))
 
 
@@ -193,30 +305,53 @@ def edit_venue(venue_id):
 @venues_blueprint.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     form = VenueForm(request.form, meta={'csrf': False})
-    venue = Venue.query.get(venue_id)
 
     if form.validate_on_submit():
         try:
-            venue = Venue.query.get(venue_id)
-            venue.name = form.name.data
-            venue.city = form.city.data
-            venue.state = form.state.data
-            venue.address = form.address.data
-            venue.phone = form.phone.data
-            venue.genres = form.genres.data
-            venue.facebook_link = form.facebook_link.data
-            venue.image_link = form.image_link.data
-            venue.website_link = form.website_link.data
-            venue.seeking_talent = form.seeking_talent.data
-            venue.seeking_description = form.seeking_description.data
+            result = update_changed(Venue, venue_id, {
+                'name': form.name.data,
+                'city': form.city.data,
+                'state': form.state.data,
+                'address': form.address.data,
+                'phone': form.phone.data,
+                'genres': form.genres.data,
+                'facebook_link': form.facebook_link.data,
+                'image_link': form.image_link.data,
+                'website_link': form.website_link.data,
+                'seeking_talent': form.seeking_talent.data,
+                'seeking_description': form.seeking_description.data,
+            }, expected_version=request.form.get('version', type=int))
+            if result is None:
+                abort(404)
+            if result.conflict:
+                db.session.rollback()
+                flash('Venue ' + form.name.data + ' was changed by someone else while you were editing it. '
+                      'Your changes are kept below; compare them with the current details and submit again.')
+                # the submitted values stay in the form, next to the current row and its new version
+                return render_template('forms/edit_venue.html',
+                                       form=form,
+                                       venue=Venue.query.get_or_404(venue_id),
+                                       conflict=True), 409
+            if not result.changed:
+                flash('Venue ' + form.name.data + ' is unchanged.')
+                return redirect(url_for('venues.show_venue', venue_id=venue_id))
+            # the venues listing, its tiles and the typeahead only show the name and location
+            listed_changed = bool(result.changed.keys() & {'name', 'city', 'state'})
+            if listed_changed:
+                record_changes('venue', venue_id)
             db.session.commit()
-            flash('Venue ' + venue.name + ' was successfully edited!')
-            return redirect(url_for('venues.show_venue', venue_id=venue_id))
         except SQLAlchemyError:
             db.session.rollback()
+        else:
+            if listed_changed:
+                invalidate_after_commit(invalidate_area_summary)
+                typeahead_index.update('venue', venue_id, form.name.data, form.city.data, form.state.data)
+            invalidate_after_commit(partial(invalidate_venue_pages, venue_id))
+            flash('Venue ' + form.name.data + ' was successfully edited!')
+            return redirect(url_for('venues.show_venue', venue_id=venue_id))
         finally:
             db.session.close()
 
     for key, value in form.errors.items():
         flash(f"{key}: {value}\n")
-    return render_template('forms/edit_venue.html', form=form, venue=venue)
+    return render_template('forms/edit_venue.html', form=form, venue=Venue.query.get_or_404(venue_id))
@@ -0,0 +1,7 @@
+# Production WSGI entrypoint, loaded once by the pre-forking launcher:
+#   gunicorn -c gunicorn.conf.py
+# importing app builds the one application object; creating another would register its hooks twice
+from app import app, warm_up_templates, warm_up_typeahead
+
+warm_up_templates(app)
+warm_up_typeahead(app)